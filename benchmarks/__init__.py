@@ -0,0 +1,4 @@
+"""Synthetic data generator and load scenarios for the library API.
+
+Run ``python -m benchmarks.run --help`` from the repository root.
+"""
@@ -0,0 +1,97 @@
+"""Worker cold-start time: importing ``src.main`` and building the app.
+
+Each sample runs in a fresh interpreter, like a new gunicorn worker
+without ``--preload``. Also lists the slowest imports (``-X importtime``)
+and whether heavy optional modules were loaded at boot.
+
+    python -m benchmarks.cold_start --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.run import REPO_ROOT
+
+# Only needed once someone signs in
+DEFERRED_MODULES = ('google.auth', 'google.oauth2', 'requests', 'rsa')
+
+PROBE = f'''
+import json, sys, time
+start = time.perf_counter()
+from src.main import app
+boot = time.perf_counter() - start
+with app.test_client() as client:
+    start = time.perf_counter()
+    client.get('/api/books?per_page=1')
+    first_request = time.perf_counter() - start
+print(json.dumps({{
+    'boot': boot,
+    'first_request': first_request,
+    'loaded': [name for name in {DEFERRED_MODULES!r} if name in sys.modules]
+}}))
+'''
+
+
+def sample(env):
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=REPO_ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(env, count):
+    """Modules imported directly by ``src.main``, by cumulative import time in seconds"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import src.main'], cwd=REPO_ROOT,
+                            env=env, check=True, capture_output=True, text=True).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Children are printed before their parent, indented two more spaces
+        entries.append((len(name) - len(name.lstrip()), int(cumulative) / 1e6, name.strip()))
+
+    position = next(i for i, entry in enumerate(entries) if entry[2] == 'src.main')
+    depth = entries[position][0]
+    modules = []
+    for child_depth, seconds, name in reversed(entries[:position]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 2:
+            modules.append((seconds, name))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure worker cold-start time')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports to list')
+    parser.add_argument('--database-url', help='Defaults to a fresh SQLite file, prepared with `flask release`')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    if args.database_url:
+        env['DATABASE_URL'] = args.database_url
+    else:
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='library-cold-'), 'cold.db')}"
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'src.main', 'release'], cwd=REPO_ROOT, env=env,
+                       check=True, capture_output=True)
+
+    samples = [sample(env) for _ in range(args.runs)]
+    for key, label in (('boot', 'import + create_app'), ('first_request', 'first request')):
+        values = sorted(s[key] * 1000 for s in samples)
+        print(f"{label:>20}: median {statistics.median(values):7.1f} ms  min {values[0]:7.1f} ms  max {values[-1]:7.1f} ms")
+    loaded = sorted({name for s in samples for name in s['loaded']})
+    print(f"{'loaded at boot':>20}: {', '.join(loaded) if loaded else 'none of ' + ', '.join(DEFERRED_MODULES)}")
+
+    print('\nSlowest imports (cumulative):')
+    for seconds, name in slowest_imports(env, args.top):
+        print(f"  {seconds * 1000:7.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+GENRES = (
+    'Fiction', 'Mystery', 'Science Fiction', 'Fantasy', 'Biography', 'History',
+    'Science', 'Poetry', 'Romance', 'Thriller', 'Philosophy', 'Travel'
+)
+WORDS = (
+    'river', 'shadow', 'garden', 'empire', 'winter', 'silent', 'golden', 'night',
+    'journey', 'stone', 'letters', 'ocean', 'forgotten', 'city', 'fire', 'house',
+    'memory', 'glass', 'north', 'storm', 'secret', 'iron', 'summer', 'machine',
+    'kingdom', 'light', 'wild', 'song', 'island', 'paper', 'last', 'crown'
+)
+FIRST_NAMES = ('Ada', 'Ben', 'Chloe', 'Dev', 'Elena', 'Farid', 'Grace', 'Hugo', 'Iris', 'Jonas', 'Kai', 'Lena')
+LAST_NAMES = ('Adams', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ito', 'Novak', 'Okafor', 'Singh')
+
+CHUNK_SIZE = 5000
+REFRESH_TOKEN_PREFIX = 'bench-refresh-'
+
+
+def user_email(index):
+    return f'user{index}@bench.test'
+
+
+def refresh_token_value(index):
+    return f'{REFRESH_TOKEN_PREFIX}{index}'
+
+
+def _title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).title()
+
+
+def _person(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def book_rows(count, rng, checked_out_ratio=0.2, borrowers=500):
+    """Yield book column dicts; some are checked out, a few of those overdue"""
+    now = datetime.utcnow()
+    for i in range(count):
+        row = {
+            'title': _title(rng),
+            'author': _person(rng),
+            'isbn': f'979-{i:010d}',
+            'genre': rng.choice(GENRES),
+            'publication_year': rng.randint(1850, 2025),
+            'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))),
+            'is_checked_out': False,
+            'borrower_name': None,
+            'borrower_email': None,
+            'checkout_date': None,
+            'due_date': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        if rng.random() < checked_out_ratio:
+            borrower = rng.randrange(borrowers)
+            checkout_date = now - timedelta(days=rng.randint(0, 40))
+            row.update(
+                is_checked_out=True,
+                borrower_name=f'Borrower {borrower}',
+                borrower_email=f'borrower{borrower}@bench.test',
+                checkout_date=checkout_date,
+                due_date=checkout_date + timedelta(days=14)
+            )
+        yield row
+
+
+def loan_event_rows(count, book_ids, rng, borrowers=500, days=90):
+    """Yield checkout/check-in event pairs for ``count`` returned loans over the last ``days`` days"""
+    from src.models.book import LoanEvent
+
+    now = datetime.utcnow()
+    for _ in range(count):
+        borrower_email = f'borrower{rng.randrange(borrowers)}@bench.test'
+        book_id = rng.choice(book_ids)
+        checkout_date = now - timedelta(days=days) + timedelta(seconds=rng.randrange(days * 86400))
+        yield {
+            'book_id': book_id, 'borrower_email': borrower_email, 'action': LoanEvent.CHECKOUT,
+            'occurred_at': checkout_date, 'due_date': checkout_date + timedelta(days=14)
+        }
+        yield {
+            'book_id': book_id, 'borrower_email': borrower_email, 'action': LoanEvent.CHECKIN,
+            'occurred_at': min(checkout_date + timedelta(days=rng.randint(1, 21)), now), 'due_date': None
+        }
+
+
+def user_rows(count, rng):
+    from src.models.user import UserRole
+
+    # Members only: logins re-derive roles from ADMIN_EMAILS/LIBRARIAN_EMAILS anyway
+    now = datetime.utcnow()
+    for i in range(count):
+        yield {
+            'email': user_email(i),
+            'name': _person(rng),
+            'google_id': f'bench-{user_email(i)}',
+            'role': UserRole.MEMBER,
+            'is_active': True,
+            'created_at': now,
+            'updated_at': now
+        }
+
+
+def refresh_token_rows(count, user_ids, rng):
+    from src.models.user import RefreshToken
+
+    expires_at = datetime.utcnow() + timedelta(days=30)
+    for i in range(count):
+        yield {
+            'user_id': rng.choice(user_ids),
+            'token_hash': RefreshToken.hash_token(refresh_token_value(i)),
+            'expires_at': expires_at,
+            'is_revoked': False
+        }
+
+
+def _insert_chunks(table, rows):
+    from src.models.user import db
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            db.session.execute(table.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+
+
+def generate(books=10000, users=1000, refresh_tokens=1000, seed=1, loans=None):
+    """Bulk-load synthetic books, users, refresh tokens and loan history into the app's database.
+
+    Rows go in with executemany inserts (bypassing the ORM's per-object
+    bookkeeping), then the search index, stats row and loan rollups are
+    rebuilt once. The ledger gets a checkout for every open loan, as
+    revision 0003 seeds it, plus ``loans`` returned loans (default: one
+    per book). Must run inside an app context. Returns the elapsed time
+    per step.
+    """
+    from src.models.book import Book, LoanEvent
+    from src.models.user import User, RefreshToken, db
+    from src.services.loan_ledger import loan_ledger
+    from src.services.search_service import search_service
+    from src.services.stats_service import stats_service
+
+    rng = random.Random(seed)
+    timings = {}
+
+    start = time.perf_counter()
+    _insert_chunks(Book.__table__, book_rows(books, rng))
+    _insert_chunks(User.__table__, user_rows(users, rng))
+    db.session.flush()
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.email.like('%@bench.test'))]
+    if refresh_tokens and user_ids:
+        _insert_chunks(RefreshToken.__table__, refresh_token_rows(refresh_tokens, user_ids, rng))
+    book_ids = [book_id for (book_id,) in db.session.query(Book.id)]
+    if book_ids:
+        _insert_chunks(LoanEvent.__table__, loan_event_rows(books if loans is None else loans, book_ids, rng))
+    _insert_chunks(LoanEvent.__table__, (
+        {'book_id': book.id, 'borrower_email': book.borrower_email, 'action': LoanEvent.CHECKOUT,
+         'occurred_at': book.checkout_date, 'due_date': book.due_date}
+        for book in db.session.query(Book.id, Book.borrower_email, Book.checkout_date, Book.due_date)
+                              .filter(Book.is_checked_out == True)
+    ))
+    db.session.commit()
+    timings['insert_seconds'] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    search_service.rebuild()
+    stats_service.reconcile()
+    with db.engine.begin() as connection:
+        loan_ledger.rebuild_rollups(connection)
+    timings['index_seconds'] = round(time.perf_counter() - start, 3)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fill a database with synthetic library data')
+    parser.add_argument('--database-url', required=True, help='e.g. sqlite:////tmp/bench.db (should be empty)')
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--refresh-tokens', type=int, default=1000)
+    parser.add_argument('--loans', type=int, default=None, help='Returned loans in the ledger (default: one per book)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    os.environ['DATABASE_URL'] = args.database_url
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.main import app, prepare_database
+
+    with app.app_context():
+        prepare_database()
+        timings = generate(args.books, args.users, args.refresh_tokens, args.seed, args.loans)
+    print(f"Generated {args.books} books, {args.users} users, {args.refresh_tokens} refresh tokens: {timings}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import rsa
+from google.auth import crypt, jwt
+
+KEY_ID = 'benchmark-key'
+CLIENT_ID = 'benchmark-client.apps.googleusercontent.com'
+
+
+class GoogleKeyStub:
+    """Local stand-in for Google's signing-key endpoint and ID-token issuer.
+
+    Serves one RSA public key in the format of Google's v1 certs endpoint
+    and signs ID tokens with the matching private key, so the app's real
+    verification path runs with no network access. Point the app at it
+    with ``GOOGLE_CERTS_URL=stub.certs_url``. ``delay`` and ``max_age``
+    simulate a slow endpoint whose keys must be fetched again every time.
+    """
+
+    def __init__(self, key_bits=1024, delay=0.0, max_age=3600):
+        public_key, private_key = rsa.newkeys(key_bits)
+        self.signer = crypt.RSASigner.from_string(private_key.save_pkcs1().decode(), KEY_ID)
+        body = json.dumps({KEY_ID: public_key.save_pkcs1().decode()}).encode()
+        self.fetches = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.fetches += 1
+                time.sleep(delay)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Cache-Control', f'public, max-age={max_age}')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.certs_url = f'http://127.0.0.1:{self.server.server_port}/oauth2/v1/certs'
+        threading.Thread(target=self.server.serve_forever, name='google-key-stub', daemon=True).start()
+
+    def id_token(self, email, name='Benchmark User', audience=CLIENT_ID, lifetime=3600):
+        now = int(time.time())
+        claims = {
+            'iss': 'https://accounts.google.com',
+            'aud': audience,
+            'sub': f'bench-{email}',
+            'email': email,
+            'name': name,
+            'iat': now,
+            'exp': now + lifetime
+        }
+        return jwt.encode(self.signer, claims).decode()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
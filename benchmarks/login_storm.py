@@ -0,0 +1,133 @@
+"""Catalog read latency while logins wait on a slow Google key endpoint.
+
+For each gunicorn worker class, measures ``GET /api/books`` latency first
+on its own and then while ``--storm`` clients keep logging in against a
+key server that takes ``--google-delay`` seconds per request and forbids
+caching. With sync workers the logins occupy every worker and reads
+queue behind them; with threaded workers reads should stay flat.
+
+    python -m benchmarks.login_storm --workers 2 --worker-classes sync,gthread
+"""
+import argparse
+import http.client
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from benchmarks.run import HttpClient, JWT_SECRET, percentile, start_gunicorn
+from benchmarks.datagen import generate, user_email
+from benchmarks.google_stub import GoogleKeyStub, CLIENT_ID
+
+
+def measure_reads(client, duration, readers):
+    """Latencies of catalog reads issued back to back by ``readers`` threads for ``duration`` seconds"""
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def reader(index):
+        rng = random.Random(index)
+        while time.monotonic() < deadline:
+            status, _, seconds = client.request('GET', f'/api/books?page={rng.randint(1, 20)}&per_page=20')
+            with lock:
+                samples.append(seconds)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(samples)
+
+
+def run_storm(client, id_tokens, clients, stop):
+    """Start ``clients`` threads that log in until ``stop`` is set; returns (threads, statuses)"""
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def login(index):
+        rng = random.Random(index)
+        while not stop.is_set():
+            try:
+                status, _, _ = client.request('POST', '/api/auth/google', body={'token': rng.choice(id_tokens)})
+            except (OSError, http.client.HTTPException):
+                status = 'error'
+            with lock:
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=login, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    return threads, statuses
+
+
+def summarize(samples):
+    return ' '.join(f"{name} {percentile(samples, q) * 1000:7.1f} ms" for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Catalog read latency during a login storm against slow Google keys')
+    parser.add_argument('--worker-classes', default='sync,gthread')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gthread worker')
+    parser.add_argument('--storm', type=int, default=8, help='Concurrent login clients')
+    parser.add_argument('--google-delay', type=float, default=2.0, help='Seconds the key server takes to answer')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of reads per phase')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--books', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    stub = GoogleKeyStub(delay=args.google_delay, max_age=0)
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='library-storm-'), 'bench.db')}"
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        GOOGLE_CERTS_URL=stub.certs_url,
+        GOOGLE_CLIENT_ID=CLIENT_ID,
+        JWT_SECRET_KEY=JWT_SECRET
+    )
+    os.environ.update(env)
+    from src.main import app, prepare_database
+
+    with app.app_context():
+        prepare_database()
+        generate(books=args.books, users=100, refresh_tokens=0)
+    id_tokens = [stub.id_token(user_email(i)) for i in range(100)]
+
+    try:
+        for worker_class in [name.strip() for name in args.worker_classes.split(',') if name.strip()]:
+            # gunicorn silently turns sync into gthread when threads > 1
+            threads = args.threads if worker_class == 'gthread' else 1
+            process, port = start_gunicorn(env, args.workers, f'-k {worker_class} --threads {threads}')
+            client = HttpClient('127.0.0.1', port)
+            try:
+                measure_reads(client, 1.0, args.readers)  # warm up
+                quiet = measure_reads(client, args.duration, args.readers)
+
+                stop = threading.Event()
+                storm_threads, statuses = run_storm(client, id_tokens, args.storm, stop)
+                time.sleep(min(args.google_delay, 1.0))  # let the logins pile up first
+                storm = measure_reads(client, args.duration, args.readers)
+                stop.set()
+                for thread in storm_threads:
+                    thread.join(timeout=args.google_delay + 10)
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+            print(f"\n{worker_class} ({args.workers} workers x {threads} threads):")
+            print(f"  reads, quiet:       {summarize(quiet)} ({len(quiet)} requests)")
+            print(f"  reads, login storm: {summarize(storm)} ({len(storm)} requests)")
+            print(f"  login responses:    {dict(statuses)}")
+    finally:
+        stub.close()
+    print(f"\nKey server requests: {stub.fetches}")
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
@@ -0,0 +1,336 @@
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.datagen import generate, user_email
+from benchmarks.google_stub import GoogleKeyStub, CLIENT_ID
+from benchmarks.scenarios import SCENARIOS, Context, Session, thread_state
+
+JWT_SECRET = 'benchmark-jwt-secret'
+
+
+class Recorder:
+    """Latency samples and error counts per request label"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, label, seconds, status):
+        with self._lock:
+            self.samples.setdefault(label, []).append(seconds)
+            if status >= 400:
+                self.errors[label] = self.errors.get(label, 0) + 1
+
+
+class InProcessClient:
+    """Calls the WSGI app directly through Flask's test client"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        start = time.perf_counter()
+        response = client.open(path, method=method, json=body, headers=headers)
+        payload = response.get_data()
+        return response.status_code, payload, time.perf_counter() - start
+
+
+class HttpClient:
+    """Plain HTTP/1.1 client with one connection per thread, reused while the server allows"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            conn.request(method, path, body=data, headers=headers)
+            response = conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+        if response.will_close:
+            conn.close()
+            self._local.conn = None
+        return response.status, payload, time.perf_counter() - start
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(name, client, ctx, iterations, concurrency, warmup, seed):
+    """Run one scenario from ``concurrency`` threads; returns per-label results"""
+    scenario = SCENARIOS[name]
+    recorder = Recorder()
+    counts = [iterations // concurrency + (1 if i < iterations % concurrency else 0) for i in range(concurrency)]
+    failures = []
+
+    def worker(index):
+        rng = random.Random(f'{seed}-{name}-{index}')
+        state = thread_state(name, ctx, index, concurrency)
+        try:
+            warm = Session(client, recorder, record=False)
+            for _ in range(warmup // concurrency):
+                scenario(warm, ctx, rng, state)
+            barrier.wait()
+            session = Session(client, recorder)
+            for _ in range(counts[index]):
+                scenario(session, ctx, rng, state)
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as e:
+            failures.append(e)
+            barrier.abort()
+
+    barrier = threading.Barrier(concurrency + 1)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if failures:
+        raise RuntimeError(f'Scenario {name} failed: {failures[0]!r}')
+
+    results = {}
+    for label, samples in recorder.samples.items():
+        samples.sort()
+        results[label] = {
+            'scenario': name,
+            'requests': len(samples),
+            'errors': recorder.errors.get(label, 0),
+            'rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+            'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(samples, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 3)
+        }
+    return results
+
+
+def prepare(app, args, stub):
+    """Load synthetic data and build the shared scenario inputs"""
+    from src.models.book import Book
+    from src.models.user import User, db
+    from src.services.auth_service import auth_service
+
+    with app.app_context():
+        if User.query.filter(User.email.like('%@bench.test')).first() is None:
+            timings = generate(args.books, args.users, args.refresh_tokens, args.seed)
+            print(f"Generated {args.books} books, {args.users} users, {args.refresh_tokens} refresh tokens: {timings}")
+        else:
+            print('Reusing existing benchmark data')
+        admin = User.query.filter_by(email='admin@library.com').one()
+        admin_token = auth_service.generate_access_token(admin)
+        book_ids = [book_id for (book_id,) in db.session.query(Book.id)]
+        available = [book_id for (book_id,) in db.session.query(Book.id).filter(Book.is_checked_out == False)]
+
+    rng = random.Random(args.seed)
+    # Signing happens up front so it is not part of the measured login latency
+    id_tokens = [stub.id_token(user_email(rng.randrange(max(args.users, 1)))) for _ in range(min(args.requests, 500))]
+    return Context(admin_token, book_ids, available[:2000], id_tokens, args.refresh_tokens)
+
+
+def start_gunicorn(env, workers, extra_args):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+               '--log-level', 'warning'] + shlex.split(extra_args) + ['src.main:app']
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {process.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/books?per_page=1')
+            conn.getresponse().read()
+            conn.close()
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start within 60 seconds')
+
+
+def compare(results, current_meta, baseline, threshold, min_delta_ms):
+    """Print p50/p95 changes against a baseline; return the labels that regressed"""
+    regressions = []
+    meta = baseline.get('meta', {})
+    print(f"\nCompared with baseline ({meta.get('timestamp', 'unknown')}, revision {meta.get('revision')}):")
+    if meta.get('target') != current_meta['target'] or meta.get('concurrency') != current_meta['concurrency']:
+        print('  Warning: the baseline used a different target or concurrency')
+    for label, current in results.items():
+        previous = baseline.get('results', {}).get(label)
+        if previous is None:
+            print(f'  {label:<28} new')
+            continue
+        changes = []
+        regressed = False
+        for key in ('p50_ms', 'p95_ms'):
+            before, after = previous[key], current[key]
+            change = (after - before) / before if before else 0.0
+            changes.append(f'{key[:3]} {before:.2f} -> {after:.2f} ms ({change:+.0%})')
+            if change > threshold and after - before > min_delta_ms:
+                regressed = True
+        print(f"  {label:<28} {', '.join(changes)}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(label)
+    return regressions
+
+
+def print_table(results):
+    print(f"\n{'endpoint':<28} {'reqs':>6} {'errs':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, r in results.items():
+        print(f"{label:<28} {r['requests']:>6} {r['errors']:>5} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the library API against synthetic data')
+    parser.add_argument('--target', choices=('inprocess', 'gunicorn'), default='inprocess')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--database-url', help='Database to use; defaults to a fresh SQLite file')
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--refresh-tokens', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=500, help='Timed iterations per scenario')
+    parser.add_argument('--warmup', type=int, default=50, help='Untimed iterations per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('--gunicorn-args', default='', help='Extra gunicorn arguments, e.g. "-k gthread --threads 8"')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write results JSON here (use as a later --baseline)')
+    parser.add_argument('--baseline', help='Results JSON from an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative p50/p95 slowdown that counts as a regression')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='Ignore slowdowns smaller than this')
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+    if not args.refresh_tokens and 'refresh' in names:
+        names.remove('refresh')
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='library-bench-'), 'bench.db')}"
+
+    stub = GoogleKeyStub()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        GOOGLE_CERTS_URL=stub.certs_url,
+        GOOGLE_CLIENT_ID=CLIENT_ID,
+        JWT_SECRET_KEY=JWT_SECRET
+    )
+    os.environ.update(env)
+    from src.main import app, prepare_database
+
+    with app.app_context():
+        prepare_database()
+    ctx = prepare(app, args, stub)
+    process = None
+    if args.target == 'gunicorn':
+        process, port = start_gunicorn(env, args.workers, args.gunicorn_args)
+        client = HttpClient('127.0.0.1', port)
+    else:
+        client = InProcessClient(app)
+
+    results = {}
+    try:
+        for name in names:
+            print(f'Running {name}...', flush=True)
+            results.update(run_scenario(name, client, ctx, args.requests, args.concurrency, args.warmup, args.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        stub.close()
+
+    print_table(results)
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'target': args.target,
+            'workers': args.workers if args.target == 'gunicorn' else None,
+            'gunicorn_args': args.gunicorn_args or None,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'books': args.books,
+            'users': args.users,
+            'refresh_tokens': args.refresh_tokens,
+            'python': platform.python_version()
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nResults written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, report['meta'], baseline, args.threshold, args.min_delta_ms):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import json
+from urllib.parse import quote
+from benchmarks.datagen import WORDS, refresh_token_value
+
+
+class Session:
+    """Per-thread view of a client that times every request under a label"""
+
+    def __init__(self, client, recorder, record=True):
+        self.client = client
+        self.recorder = recorder
+        self.record = record
+
+    def request(self, label, method, path, body=None, headers=None):
+        status, payload, seconds = self.client.request(method, path, body=body, headers=headers)
+        if self.record:
+            self.recorder.add(label, seconds, status)
+        return status, payload
+
+
+class Context:
+    """Shared inputs prepared before the timed runs start"""
+
+    def __init__(self, admin_token, book_ids, available_book_ids, id_tokens, refresh_token_count):
+        self.admin_headers = {'Authorization': f'Bearer {admin_token}'}
+        self.book_ids = book_ids
+        self.available_book_ids = available_book_ids
+        self.id_tokens = id_tokens
+        self.refresh_token_count = refresh_token_count
+
+
+def list_books(session, ctx, rng, state):
+    session.request('GET /books', 'GET', f'/api/books?page={rng.randint(1, 50)}&per_page=20')
+
+
+def list_books_cursor(session, ctx, rng, state):
+    # Walk the title ordering page by page, starting over at the end
+    cursor = state.get('cursor') or ''
+    status, payload = session.request('GET /books?cursor', 'GET', f'/api/books?cursor={cursor}&sort=title&per_page=50')
+    state['cursor'] = json.loads(payload).get('next_cursor') if status == 200 else None
+
+
+def search(session, ctx, rng, state):
+    terms = ' '.join(rng.choice(WORDS)[:rng.randint(3, 6)] for _ in range(rng.randint(1, 2)))
+    session.request('GET /books?search', 'GET', f'/api/books?search={quote(terms)}&per_page=20')
+    session.request('GET /books/search', 'GET', f'/api/books/search?title={rng.choice(WORDS)}&available_only=true')
+
+
+def book_detail(session, ctx, rng, state):
+    session.request('GET /books/<id>', 'GET', f'/api/books/{rng.choice(ctx.book_ids)}')
+
+
+def circulation(session, ctx, rng, state):
+    # Each thread owns a disjoint slice of available books, so no conflicts
+    book_id = rng.choice(state['books'])
+    session.request('POST /books/<id>/checkout', 'POST', f'/api/books/{book_id}/checkout', body={
+        'borrower_name': 'Bench Borrower',
+        'borrower_email': 'bench.borrower@bench.test'
+    }, headers=ctx.admin_headers)
+    session.request('POST /books/<id>/checkin', 'POST', f'/api/books/{book_id}/checkin', headers=ctx.admin_headers)
+
+
+def refresh(session, ctx, rng, state):
+    token = refresh_token_value(rng.randrange(ctx.refresh_token_count))
+    session.request('POST /auth/refresh', 'POST', '/api/auth/refresh', body={'refresh_token': token})
+
+
+def login(session, ctx, rng, state):
+    session.request('POST /auth/google', 'POST', '/api/auth/google', body={'token': rng.choice(ctx.id_tokens)})
+
+
+# Run in this order: login revokes the user's earlier refresh tokens, so it goes last
+SCENARIOS = {
+    'list_books': list_books,
+    'list_books_cursor': list_books_cursor,
+    'search': search,
+    'book_detail': book_detail,
+    'refresh': refresh,
+    'circulation': circulation,
+    'login': login
+}
+
+
+def thread_state(name, ctx, thread_index, threads):
+    """Initial per-thread state for a scenario"""
+    if name == 'circulation':
+        books = ctx.available_book_ids[thread_index::threads]
+        return {'books': books or ctx.available_book_ids[:1]}
+    return {}
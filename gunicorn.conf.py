@@ -0,0 +1,42 @@
+import glob
+import os
+import tempfile
+import time
+
+# Loaded automatically by `gunicorn src.main:app` when run from the repo root.
+# Imported up front: child_exit runs from the master's SIGCHLD handler.
+from src.services.metrics import mark_process_dead, metrics
+
+# Threaded workers: a request waiting on I/O (e.g. Google's signing keys)
+# holds one thread instead of a whole worker. Everything shared between
+# threads (caches, metrics, HTTP sessions) is lock-protected or
+# thread-local, and each thread gets its own database session.
+# Set GUNICORN_WORKER_CLASS=sync for the previous behaviour.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# gunicorn turns sync into gthread whenever threads > 1
+threads = int(os.environ.get('GUNICORN_THREADS', 8 if worker_class == 'gthread' else 1))
+
+
+def on_starting(server):
+    """Point every worker at one metrics directory, cleared of a previous run's snapshots"""
+    directory = os.environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), f'library-metrics-{os.getpid()}')
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        os.remove(path)
+    os.environ['METRICS_DIR'] = directory
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    """Report how long this worker took to import and build the app"""
+    seconds = time.perf_counter() - worker.forked_at
+    metrics.worker_booted(seconds)
+    worker.log.info("Worker %s ready in %.3fs", worker.pid, seconds)
+
+
+def child_exit(server, worker):
+    """Keep an exited worker's counters in the aggregated /api/metrics output"""
+    mark_process_dead(os.environ['METRICS_DIR'], worker.pid)
@@ -3,80 +3,141 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
-from src.models.user import db, User, RefreshToken, UserRole  # Updated import
+from src.models.user import db  # Models register with db on import
 from src.models.book import Book
 from src.routes.user import user_bp
 from src.routes.book import book_bp
 from src.routes.auth import auth_bp  # Import auth routes
+from src.routes.metrics import metrics_bp
 from src.services.auth_service import auth_service  # Import auth service
+from src.services.search_service import search_service
+from src.services.stats_service import stats_service
+from src.services.import_service import import_service
+from src.services.response_cache import response_cache
+from src.services.metrics import metrics
+from src.services.migration_service import migration_service
+from src.services.static_assets import static_assets
+from src.services.token_pruner import token_pruner
+from src.services.write_behind import write_behind
+from src.services.loan_ledger import loan_ledger
+from src.services.suggest_index import suggest_index
+from src.utils.database import configure_engine_options, install_engine_hooks
+
+
+def create_app(config=None):
+    """Build and configure the application.
+
+    Nothing here touches the database or loads optional heavy modules, so a
+    gunicorn worker is ready as soon as its imports are done. Tables,
+    migrations, the default admin and the search/stats backfill are handled
+    once per deploy by ``flask release``. ``config`` overrides settings
+    read from the environment.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+
+    # Configuration
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
+    app.config['GOOGLE_CLIENT_ID'] = os.environ.get('GOOGLE_CLIENT_ID')
+    app.config['ADMIN_EMAILS'] = os.environ.get('ADMIN_EMAILS', '')  # Comma-separated; read once at startup
+    app.config['LIBRARIAN_EMAILS'] = os.environ.get('LIBRARIAN_EMAILS', '')
+    app.config['GOOGLE_CERTS_URL'] = os.environ.get('GOOGLE_CERTS_URL')  # Override to use a local key server
+    app.config['GOOGLE_KEYS_WAIT_TIMEOUT'] = float(os.environ.get('GOOGLE_KEYS_WAIT_TIMEOUT', 3))  # Max seconds a login waits for signing keys
+    app.config['CATALOG_CDN_MAX_AGE'] = int(os.environ.get('CATALOG_CDN_MAX_AGE', 0))  # s-maxage for anonymous catalog reads
+    app.config['RESPONSE_CACHE_URL'] = os.environ.get('RESPONSE_CACHE_URL')  # e.g. redis://localhost:6379/0; in-process if unset
+    app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+    app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 1000))
+    app.config['AUTH_CACHE_TTL'] = int(os.environ.get('AUTH_CACHE_TTL', 30))
+    app.config['AUTH_CACHE_SIZE'] = int(os.environ.get('AUTH_CACHE_SIZE', 10000))
+    app.config['AUTH_PERMISSION_CLAIMS'] = os.environ.get('AUTH_PERMISSION_CLAIMS', 'false').lower() == 'true'  # Authorize from token claims without loading the user
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')  # Shared by gunicorn workers; set by gunicorn.conf.py
+    app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # Bearer token required by /api/metrics if set
+    app.config['WRITE_BEHIND_INTERVAL'] = float(os.environ.get('WRITE_BEHIND_INTERVAL', 5))  # Seconds between last_login flushes
+    app.config['WRITE_BEHIND_MAX_PENDING'] = int(os.environ.get('WRITE_BEHIND_MAX_PENDING', 1000))
+    app.config['REFRESH_TOKEN_PRUNE_INTERVAL'] = int(os.environ.get('REFRESH_TOKEN_PRUNE_INTERVAL', 3600))  # Seconds; 0 leaves pruning to `flask tokens-prune`
+    app.config['SUGGEST_SYNC_INTERVAL'] = int(os.environ.get('SUGGEST_SYNC_INTERVAL', 30))  # Seconds between checks for other workers' book writes; 0 disables
+
+    # Database configuration
+    # Use environment variable for database URL in production, fallback to local SQLite
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    else:
+        # For local development, create database directory if it doesn't exist
+        db_dir = os.path.join(os.path.dirname(__file__), 'database')
+        os.makedirs(db_dir, exist_ok=True)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(db_dir, 'app.db')}"
+
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE')  # sqlite, server or default; chosen from the URL if unset
+    app.config.update(config or {})
+
+    # Enable CORS for all routes
+    # Example for when you have a specific frontend domain
+    CORS(app, 
+         resources={r"/api/*": {"origins": ["https://library-nextjs-2lzi.vercel.app", "http://localhost:3000"]}},
+         supports_credentials=True)
+
+    # Register blueprints
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(book_bp, url_prefix='/api')
+    app.register_blueprint(auth_bp, url_prefix='/api')  # Register auth routes
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+
+    # Initialize auth service
+    auth_service.init_app(app)
+    search_service.init_app(app)
+    stats_service.init_app(app)
+    import_service.init_app(app)
+    response_cache.init_app(app)
+    migration_service.init_app(app)
+    static_assets.init_app(app)
+    token_pruner.init_app(app)
+    write_behind.init_app(app)
+    loan_ledger.init_app(app)
+    suggest_index.init_app(app)
+
+    configure_engine_options(app)
+    db.init_app(app)
+    install_engine_hooks(app, db)
+    metrics.init_app(app)  # Needs the engine, so after db.init_app
+
+    @app.cli.command('release')
+    def release():
+        """Prepare the database for this release: schema, migrations, default admin, search index and stats."""
+        prepare_database()
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        # Files come from the manifest built on first use; anything else gets index.html
+        return static_assets.response(path)
+
+    return app
+
+
+def prepare_database():
+    """Bring the database up to date; run once per deploy, not per worker (requires app context)"""
+    for migration in migration_service.upgrade():
+        print(f"Applied {migration.revision}: {migration.description}")
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-
-# Configuration
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
-app.config['GOOGLE_CLIENT_ID'] = os.environ.get('GOOGLE_CLIENT_ID')
-
-# Enable CORS for all routes
-# Example for when you have a specific frontend domain
-CORS(app, 
-     resources={r"/api/*": {"origins": ["https://library-nextjs-2lzi.vercel.app", "http://localhost:3000"]}},
-     supports_credentials=True)
-
-# Register blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(book_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api')  # Register auth routes
-
-# Initialize auth service
-auth_service.init_app(app)
-
-# Database configuration
-# Use environment variable for database URL in production, fallback to local SQLite
-database_url = os.environ.get('DATABASE_URL')
-if database_url:
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-else:
-    # For local development, create database directory if it doesn't exist
-    db_dir = os.path.join(os.path.dirname(__file__), 'database')
-    os.makedirs(db_dir, exist_ok=True)
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(db_dir, 'app.db')}"
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-with app.app_context():
-    db.create_all()
-    
     # Create default admin user if no users exist
-    if User.query.count() == 0:
-        admin_user = User(
-            email='admin@library.com',
-            name='System Administrator',
-            role=UserRole.ADMIN
-        )
-        db.session.add(admin_user)
-        db.session.commit()
+    if auth_service.ensure_default_admin():
         print("Created default admin user: admin@library.com")
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
+    # Create and backfill the book search index
+    search_service.ensure_index()
+    stats_service.ensure_stats()
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+
+# `gunicorn src.main:app` and `FLASK_APP=src.main` use this instance
+app = create_app()
 
 
 if __name__ == '__main__':
+    with app.app_context():
+        prepare_database()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,9 @@
+"""Index the circulation and refresh-token revocation paths"""
+from src.services.migration_service import create_index
+
+
+def upgrade(connection):
+    # Checked-out books by due date (overdue counts, available_only filters)
+    create_index(connection, 'ix_book_is_checked_out_due_date', 'book', ['is_checked_out', 'due_date'])
+    # UPDATE ... WHERE user_id = ? AND is_revoked = false on every login and logout-all
+    create_index(connection, 'ix_refresh_tokens_user_id_is_revoked', 'refresh_tokens', ['user_id', 'is_revoked'])
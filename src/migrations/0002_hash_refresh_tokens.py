@@ -0,0 +1,65 @@
+"""Store refresh tokens as SHA-256 hashes and drop dead tokens"""
+import hashlib
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Index, Integer, String, DateTime, Boolean, ForeignKey, inspect, select, text
+
+BATCH_SIZE = 1000
+
+
+def _new_table(metadata, name):
+    # The schema as of this revision, independent of later model changes
+    Table('users', metadata, Column('id', Integer, primary_key=True))
+    return Table(
+        name, metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+        Column('token_hash', String(64), nullable=False),
+        Column('expires_at', DateTime, nullable=False),
+        Column('is_revoked', Boolean, nullable=False, default=False),
+        Column('created_at', DateTime),
+        Index('ix_refresh_tokens_user_id_is_revoked', 'user_id', 'is_revoked'),
+        Index('ix_refresh_tokens_token_hash', 'token_hash', unique=True)
+    )
+
+
+def upgrade(connection):
+    inspector = inspect(connection)
+    if 'token_hash' in {column['name'] for column in inspector.get_columns('refresh_tokens')}:
+        return  # Created by create_all from the current models
+
+    # The plaintext column is UNIQUE, which SQLite cannot drop, so copy the
+    # live tokens into a new table and swap it in. Index names are shared
+    # across tables, so the old ones go first.
+    old = Table('refresh_tokens', MetaData(), autoload_with=connection)
+    for index in old.indexes:
+        index.drop(connection)
+    new = _new_table(MetaData(), 'refresh_tokens_new')
+    new.create(connection)
+
+    last_id = 0
+    now = datetime.utcnow()
+    while True:
+        rows = connection.execute(
+            select(old.c.id, old.c.user_id, old.c.token, old.c.expires_at, old.c.created_at)
+            .where(old.c.id > last_id, old.c.is_revoked == False, old.c.expires_at > now)
+            .order_by(old.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(new.insert(), [
+            {
+                # New ids, so the new table's id sequence needs no adjusting
+                'user_id': row.user_id,
+                'token_hash': hashlib.sha256(row.token.encode()).hexdigest(),
+                'expires_at': row.expires_at,
+                'is_revoked': False,
+                'created_at': row.created_at
+            }
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+    old.drop(connection)
+    preparer = connection.dialect.identifier_preparer
+    connection.execute(text(f"ALTER TABLE {preparer.quote('refresh_tokens_new')} RENAME TO {preparer.quote('refresh_tokens')}"))
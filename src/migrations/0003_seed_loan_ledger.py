@@ -0,0 +1,32 @@
+"""Seed the loan ledger with the loans open today"""
+from datetime import datetime
+from sqlalchemy import Integer, String, Boolean, DateTime, SmallInteger, column, table, select, func, literal, insert
+from src.services.loan_ledger import loan_ledger
+
+# The tables as of this revision, independent of later model changes
+book = table(
+    'book',
+    column('id', Integer), column('is_checked_out', Boolean), column('borrower_email', String),
+    column('checkout_date', DateTime), column('due_date', DateTime)
+)
+loan_events = table(
+    'loan_events',
+    column('book_id', Integer), column('borrower_email', String), column('action', SmallInteger),
+    column('occurred_at', DateTime), column('due_date', DateTime)
+)
+CHECKOUT = 1
+
+
+def upgrade(connection):
+    if connection.execute(select(func.count()).select_from(loan_events)).scalar():
+        return  # Already recording; open loans are in the ledger
+
+    # Earlier history was overwritten in place and cannot be recovered
+    connection.execute(insert(loan_events).from_select(
+        ['book_id', 'borrower_email', 'action', 'occurred_at', 'due_date'],
+        select(
+            book.c.id, book.c.borrower_email, literal(CHECKOUT, SmallInteger),
+            func.coalesce(book.c.checkout_date, literal(datetime.utcnow(), DateTime)), book.c.due_date
+        ).where(book.c.is_checked_out == True)
+    ))
+    loan_ledger.rebuild_rollups(connection)
@@ -0,0 +1,9 @@
+"""Index the title keyset listing and the overdue count on existing databases"""
+from src.services.migration_service import create_index
+
+
+def upgrade(connection):
+    # Cursor pages of GET /books ordered by title
+    create_index(connection, 'ix_book_title_id', 'book', ['title', 'id'])
+    # due_date < now for the overdue count in /books/stats
+    create_index(connection, 'ix_book_due_date', 'book', ['due_date'])
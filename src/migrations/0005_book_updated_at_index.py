@@ -0,0 +1,7 @@
+"""Index book.updated_at for the suggestion index sync"""
+from src.services.migration_service import create_index
+
+
+def upgrade(connection):
+    # Each worker re-reads books with updated_at >= its last sync after catalog writes
+    create_index(connection, 'ix_book_updated_at', 'book', ['updated_at'])
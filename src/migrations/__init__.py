@@ -0,0 +1 @@
+"""Schema revisions applied by ``flask db upgrade`` (see src/services/migration_service.py)."""
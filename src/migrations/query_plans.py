@@ -0,0 +1,102 @@
+"""Hot queries and the index each one must be planned with.
+
+``flask db check-plans`` runs EXPLAIN for each statement and fails when
+the expected index does not appear in the plan, e.g. after a migration
+was skipped or a query changed shape.
+"""
+from datetime import datetime
+from sqlalchemy import text
+from src.models.book import Book
+from src.routes.book import BOOK_SORT_KEYS
+from src.services.auth_service import revoke_tokens_statement, refresh_token_statement
+from src.services.circulation_service import circulation_service, DUE_REPORT_ORDER
+from src.services.loan_ledger import loan_ledger, HISTORY_ORDER
+from src.services.search_service import search_service
+from src.services.stats_service import overdue_count_statement, checked_out_count_statement
+from src.services.suggest_index import changed_books_statement
+from src.utils.pagination import keyset_query, encode_cursor
+from src.utils.serialization import Projection
+
+# Each statement is built by the code that runs it, so a change in shape is checked too
+HOT_QUERIES = (
+    (
+        'refresh token revocation',
+        'ix_refresh_tokens_user_id_is_revoked',
+        lambda: revoke_tokens_statement(1)
+    ),
+    (
+        'refresh token lookup',
+        'ix_refresh_tokens_token_hash',
+        lambda: refresh_token_statement('token', live_only=True)
+    ),
+    (
+        'overdue count',
+        'ix_book_due_date',
+        lambda: overdue_count_statement(datetime.utcnow())
+    ),
+    (
+        'due-soon report',
+        'ix_book_is_checked_out_due_date',
+        lambda: keyset_query(
+            circulation_service.due_report('due_soon', now=datetime.utcnow())[1], DUE_REPORT_ORDER, 50,
+            cursor=encode_cursor('due', ['reader@example.com', datetime.utcnow(), 0]), sort_key='due'
+        )
+    ),
+    (
+        'checked-out books',
+        'ix_book_is_checked_out_due_date',
+        checked_out_count_statement
+    ),
+    (
+        'loan history by book',
+        'ix_loan_events_book_id_occurred_at',
+        lambda: keyset_query(loan_ledger.history_query(book_id=1), HISTORY_ORDER, 50)
+    ),
+    (
+        'loan history by borrower',
+        'ix_loan_events_borrower_email_occurred_at',
+        lambda: keyset_query(loan_ledger.history_query(borrower_email='reader@example.com'), HISTORY_ORDER, 50)
+    ),
+    (
+        'suggestion index sync',
+        'ix_book_updated_at',
+        lambda: changed_books_statement(datetime.utcnow())
+    ),
+    (
+        'cursor page by title',
+        'ix_book_title_id',
+        lambda: keyset_query(
+            search_service.filter_query(
+                Projection(Book, Book.FIELDS, extra_columns=BOOK_SORT_KEYS['title']).query(), ranked=False
+            ),
+            BOOK_SORT_KEYS['title'], 50, cursor=encode_cursor('title', ['m', 0]), sort_key='title'
+        )
+    ),
+)
+
+def explain(connection, statement):
+    """The database's plan for a statement or ORM query as one string, or None if unsupported"""
+    statement = getattr(statement, 'statement', statement)
+    compiled = statement.compile(dialect=connection.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params)
+        return ' | '.join(row[-1] for row in rows)
+    if dialect == 'postgresql':
+        # Tiny tables are cheaper to scan; ask whether an index path exists at all
+        with connection.begin_nested():
+            connection.execute(text('SET LOCAL enable_seqscan = off'))
+            rows = connection.exec_driver_sql(f'EXPLAIN {compiled}', params)
+            return ' | '.join(row[0] for row in rows)
+    return None
+
+
+def check_query_plans(connection):
+    """Yield ``(name, index, ok, plan)``; ``ok`` is None when the dialect cannot be checked"""
+    for name, index, build in HOT_QUERIES:
+        plan = explain(connection, build())
+        yield name, index, None if plan is None else index in plan, plan
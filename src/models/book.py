@@ -1,7 +1,20 @@
 from src.models.user import db
-from datetime import datetime, timedelta
+from datetime import datetime
 
 class Book(db.Model):
+    __table_args__ = (
+        db.Index('ix_book_title_id', 'title', 'id'),
+        db.Index('ix_book_is_checked_out_due_date', 'is_checked_out', 'due_date'),
+        db.Index('ix_book_updated_at', 'updated_at'),
+    )
+
+    # Fields returned by to_dict, in order (also the allowed ?fields= names)
+    FIELDS = (
+        'id', 'title', 'author', 'isbn', 'genre', 'publication_year', 'description',
+        'is_checked_out', 'borrower_name', 'borrower_email', 'checkout_date', 'due_date',
+        'created_at', 'updated_at'
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     author = db.Column(db.String(100), nullable=False)
@@ -13,7 +26,7 @@ class Book(db.Model):
     borrower_name = db.Column(db.String(100), nullable=True)
     borrower_email = db.Column(db.String(120), nullable=True)
     checkout_date = db.Column(db.DateTime, nullable=True)
-    due_date = db.Column(db.DateTime, nullable=True)
+    due_date = db.Column(db.DateTime, nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -38,31 +51,37 @@ class Book(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
-    def checkout(self, borrower_name, borrower_email, days=14):
-        """Check out the book to a borrower"""
-        if self.is_checked_out:
-            return False, "Book is already checked out"
-        
-        self.is_checked_out = True
-        self.borrower_name = borrower_name
-        self.borrower_email = borrower_email
-        self.checkout_date = datetime.utcnow()
-        self.due_date = datetime.utcnow() + timedelta(days=days)
-        self.updated_at = datetime.utcnow()
-        return True, "Book checked out successfully"
-
-    def checkin(self):
-        """Check in the book (return it)"""
-        if not self.is_checked_out:
-            return False, "Book is not checked out"
-        
-        self.is_checked_out = False
-        self.borrower_name = None
-        self.borrower_email = None
-        self.checkout_date = None
-        self.due_date = None
-        self.updated_at = datetime.utcnow()
-        return True, "Book checked in successfully"
+    @staticmethod
+    def validate_data(data):
+        """Validate and normalize book fields from a request or import row.
+
+        Returns ``(values, None)`` on success or ``(None, error_message)``.
+        """
+        if not isinstance(data, dict):
+            return None, 'Book data must be an object'
+        if not data.get('title') or not data.get('author'):
+            return None, 'Title and author are required'
+
+        isbn = data.get('isbn')
+        isbn = str(isbn).strip() if isbn is not None and str(isbn).strip() else None
+
+        publication_year = data.get('publication_year')
+        if publication_year in (None, ''):
+            publication_year = None
+        else:
+            try:
+                publication_year = int(publication_year)
+            except (TypeError, ValueError):
+                return None, 'publication_year must be an integer'
+
+        return {
+            'title': data['title'],
+            'author': data['author'],
+            'isbn': isbn,
+            'genre': data.get('genre') or None,
+            'publication_year': publication_year,
+            'description': data.get('description') or None
+        }, None
 
     def is_overdue(self):
         """Check if the book is overdue"""
@@ -70,3 +89,82 @@ class Book(db.Model):
             return False
         return datetime.utcnow() > self.due_date
 
+
+class BookSearchTerm(db.Model):
+    """Inverted index used for book search on databases without SQLite FTS5"""
+    __tablename__ = 'book_search_terms'
+
+    term = db.Column(db.String(64), primary_key=True)
+    field = db.Column(db.String(20), primary_key=True)
+    book_id = db.Column(db.Integer, primary_key=True, index=True)
+
+    def __repr__(self):
+        return f'<BookSearchTerm {self.field}:{self.term} -> {self.book_id}>'
+
+class LibraryStats(db.Model):
+    """Precomputed library counters, kept as a single row updated with every book write"""
+    __tablename__ = 'library_stats'
+
+    id = db.Column(db.Integer, primary_key=True)
+    total_books = db.Column(db.Integer, default=0, nullable=False)
+    checked_out_books = db.Column(db.Integer, default=0, nullable=False)
+    # Incremented on every book write; used as the ETag source for catalog listings
+    catalog_version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LibraryStats {self.total_books} books, {self.checked_out_books} out>'
+
+
+class LoanEvent(db.Model):
+    """Append-only ledger of checkouts and check-ins, written in the same transaction as the book.
+
+    Rows are never updated or deleted, and have no foreign key to ``book`` so
+    history outlives deleted books. ``due_date`` is only set on checkouts.
+    """
+    __tablename__ = 'loan_events'
+    __table_args__ = (
+        db.Index('ix_loan_events_book_id_occurred_at', 'book_id', 'occurred_at'),
+        db.Index('ix_loan_events_borrower_email_occurred_at', 'borrower_email', 'occurred_at'),
+    )
+
+    CHECKOUT = 1
+    CHECKIN = 2
+    ACTIONS = {CHECKOUT: 'checkout', CHECKIN: 'checkin'}
+
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, nullable=False)
+    borrower_email = db.Column(db.String(120), nullable=True)
+    action = db.Column(db.SmallInteger, nullable=False)
+    occurred_at = db.Column(db.DateTime, nullable=False, index=True)
+    due_date = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<LoanEvent {self.ACTIONS.get(self.action)} book {self.book_id} by {self.borrower_email}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'book_id': self.book_id,
+            'borrower_email': self.borrower_email,
+            'action': self.ACTIONS.get(self.action),
+            'occurred_at': self.occurred_at.isoformat() if self.occurred_at else None,
+            'due_date': self.due_date.isoformat() if self.due_date else None
+        }
+
+class LoanRollup(db.Model):
+    """Checkouts counted per day or month and per book, genre or borrower.
+
+    The primary key starts with (period, dimension, period_start), so a
+    "top N this month" report reads one small key range.
+    """
+    __tablename__ = 'loan_rollups'
+
+    period = db.Column(db.String(5), primary_key=True)  # 'day' or 'month'
+    dimension = db.Column(db.String(8), primary_key=True)  # 'book', 'genre' or 'borrower'
+    period_start = db.Column(db.Date, primary_key=True)
+    key = db.Column(db.String(120), primary_key=True)  # Book id, genre ('' for none) or borrower email
+    loans = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<LoanRollup {self.period} {self.period_start} {self.dimension}:{self.key} = {self.loans}>'
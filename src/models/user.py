@@ -1,6 +1,8 @@
+import hashlib
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from enum import Enum
+from src.utils.permissions import PermissionEngine
 
 db = SQLAlchemy()
 
@@ -10,6 +12,7 @@ class UserRole(Enum):
     MEMBER = "member"
 
 class Permission(Enum):
+    # Each permission is one bit in access tokens, in this order: add new ones at the end
     # Book permissions
     CREATE_BOOK = "create_book"
     UPDATE_BOOK = "update_book"
@@ -25,9 +28,32 @@ class Permission(Enum):
     CHECKIN_BOOK = "checkin_book"
     VIEW_LIBRARY_STATS = "view_library_stats"
 
+ROLE_PERMISSIONS = {
+    UserRole.ADMIN: frozenset([
+        Permission.CREATE_BOOK, Permission.UPDATE_BOOK, Permission.DELETE_BOOK, Permission.VIEW_BOOK,
+        Permission.MANAGE_USERS, Permission.VIEW_USERS,
+        Permission.CHECKOUT_BOOK, Permission.CHECKIN_BOOK, Permission.VIEW_LIBRARY_STATS
+    ]),
+    UserRole.LIBRARIAN: frozenset([
+        Permission.CREATE_BOOK, Permission.UPDATE_BOOK, Permission.VIEW_BOOK,
+        Permission.VIEW_USERS,
+        Permission.CHECKOUT_BOOK, Permission.CHECKIN_BOOK, Permission.VIEW_LIBRARY_STATS
+    ]),
+    UserRole.MEMBER: frozenset([
+        Permission.VIEW_BOOK,
+        Permission.CHECKOUT_BOOK, Permission.CHECKIN_BOOK
+    ])
+}
+
+# Compiled once; all permission checks go through these bitmasks
+permission_engine = PermissionEngine(Permission, ROLE_PERMISSIONS)
+
 class User(db.Model):
     __tablename__ = 'users'
     
+    # Fields returned by to_dict, in order (also the allowed ?fields= names)
+    FIELDS = ('id', 'email', 'name', 'username', 'profile_picture', 'role', 'is_active', 'created_at', 'last_login')
+    
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     name = db.Column(db.String(100), nullable=False)
@@ -58,42 +84,47 @@ class User(db.Model):
     
     def has_permission(self, permission: Permission) -> bool:
         """Check if user has a specific permission based on their role"""
-        role_permissions = {
-            UserRole.ADMIN: [
-                Permission.CREATE_BOOK, Permission.UPDATE_BOOK, Permission.DELETE_BOOK, Permission.VIEW_BOOK,
-                Permission.MANAGE_USERS, Permission.VIEW_USERS,
-                Permission.CHECKOUT_BOOK, Permission.CHECKIN_BOOK, Permission.VIEW_LIBRARY_STATS
-            ],
-            UserRole.LIBRARIAN: [
-                Permission.CREATE_BOOK, Permission.UPDATE_BOOK, Permission.VIEW_BOOK,
-                Permission.VIEW_USERS,
-                Permission.CHECKOUT_BOOK, Permission.CHECKIN_BOOK, Permission.VIEW_LIBRARY_STATS
-            ],
-            UserRole.MEMBER: [
-                Permission.VIEW_BOOK,
-                Permission.CHECKOUT_BOOK, Permission.CHECKIN_BOOK
-            ]
-        }
-        
-        return permission in role_permissions.get(self.role, [])
+        return permission_engine.role_allows(self.role, permission)
+    
+    def permission_names(self):
+        """Values of every permission the user's role grants"""
+        return permission_engine.names(permission_engine.mask(self.role))
+    
+    @staticmethod
+    def has_role_permission(role: UserRole, permission: Permission) -> bool:
+        """Check if a role grants a specific permission"""
+        return permission_engine.role_allows(role, permission)
     
     def update_last_login(self):
-        """Update the last login timestamp"""
+        """Update the last login timestamp (committed by the caller)"""
         self.last_login = datetime.utcnow()
-        db.session.commit()
 
 class RefreshToken(db.Model):
+    """A refresh token, stored only as the SHA-256 of the string given to the client.
+
+    The tokens are 64 random bytes, so an unsalted hash is enough to make a
+    leaked table useless, and it gives a fixed-width lookup key.
+    """
     __tablename__ = 'refresh_tokens'
+    __table_args__ = (
+        db.Index('ix_refresh_tokens_user_id_is_revoked', 'user_id', 'is_revoked'),
+        db.Index('ix_refresh_tokens_token_hash', 'token_hash', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    token = db.Column(db.String(255), unique=True, nullable=False)
+    token_hash = db.Column(db.String(64), nullable=False)
     expires_at = db.Column(db.DateTime, nullable=False)
     is_revoked = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref=db.backref('refresh_tokens', lazy=True))
     
+    @staticmethod
+    def hash_token(token_string):
+        """Lookup key for a token string (64 hex characters)"""
+        return hashlib.sha256(token_string.encode()).hexdigest()
+    
     def is_valid(self):
         """Check if the refresh token is still valid"""
         return not self.is_revoked and self.expires_at > datetime.utcnow()
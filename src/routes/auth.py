@@ -1,10 +1,16 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, current_app
 from src.services.auth_service import auth_service
-from src.models.user import User, UserRole, Permission, db
+from src.services.google_keys import KeyFetchError
+from src.models.user import User, UserRole, Permission, db, permission_engine
 from src.utils.auth_decorators import token_required, permission_required, admin_required
+from src.utils.pagination import get_per_page, get_bool_arg, keyset_paginate, count_cache
+from src.utils.serialization import dumps, parse_fields, Projection
 
 auth_bp = Blueprint('auth', __name__)
 
+def _json_response(body):
+    return current_app.response_class(body, mimetype='application/json')
+
 @auth_bp.route('/auth/google', methods=['POST'])
 def google_auth():
     """Handle Google OAuth authentication"""
@@ -16,29 +22,16 @@ def google_auth():
             return jsonify({'error': 'Token is required'}), 400
         
         # Verify Google token and get user info
-        user_info = auth_service.verify_google_token(token)
+        try:
+            user_info = auth_service.verify_google_token(token)
+        except KeyFetchError as e:
+            print(f"Google sign-in unavailable: {e}")
+            return jsonify({'error': 'Google sign-in is temporarily unavailable'}), 503, {'Retry-After': '5'}
         if not user_info:
             return jsonify({'error': 'Invalid Google token'}), 401
         
-        # Create or update user with automatic role assignment
-        user = auth_service.create_or_update_user(user_info)
-        
-        # Update role for existing users (in case email lists changed)
-        new_role = auth_service.determine_user_role(user.email)
-        if user.role != new_role:
-            user.role = new_role
-            db.session.commit()
-            print(f"Updated role for {user.email} to {new_role.value}")
-        
-        # Generate JWT tokens
-        access_token = auth_service.generate_access_token(user)
-        refresh_token_str = auth_service.generate_refresh_token(user)
-        
-        return jsonify({
-            'access_token': access_token,
-            'refresh_token': refresh_token_str,
-            'user': user.to_dict()
-        }), 200
+        # Create or update the user, apply role rules and issue tokens in one transaction
+        return jsonify(auth_service.login(user_info)), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -99,32 +92,63 @@ def logout_all():
 def get_current_user():
     """Get current user information"""
     user = g.current_user
+    data = user.to_dict()
+    if data is None:
+        # Deleted after the token was issued; the cache or the token's claims still vouch for it
+        auth_service.principal_cache.invalidate(user.id)
+        return jsonify({'error': 'User not found'}), 401
     return jsonify({
-        'user': user.to_dict(),
-        'permissions': [perm.value for perm in Permission if user.has_permission(perm)]
+        'user': data,
+        'permissions': list(user.permission_names())
     }), 200
 
 @auth_bp.route('/auth/users', methods=['GET'])
 @permission_required(Permission.VIEW_USERS)
 def get_users():
-    """Get all users (requires VIEW_USERS permission)"""
+    """Get all users (requires VIEW_USERS permission).
+
+    Passing ``cursor`` (empty for the first page) switches to keyset
+    pagination by id; the total is then only included with ``with_total=1``.
+    ``fields`` limits the columns selected and returned.
+    """
     try:
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        per_page = get_per_page()
+        cursor = request.args.get('cursor')
         
-        users = User.query.paginate(
+        try:
+            projection = Projection(User, parse_fields(User), extra_columns=(User.id,))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if cursor is not None:
+            try:
+                rows, next_cursor = keyset_paginate(projection.query(), (User.id,), per_page, cursor=cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            response_data = {
+                'users': projection.to_dicts(rows),
+                'next_cursor': next_cursor,
+                'per_page': per_page
+            }
+            if get_bool_arg('with_total'):
+                response_data['total'] = count_cache.count(User.query)
+            return _json_response(dumps(response_data))
+        
+        users = projection.query().order_by(User.id).paginate(
             page=page,
             per_page=per_page,
             error_out=False
         )
         
-        return jsonify({
-            'users': [user.to_dict() for user in users.items],
+        return _json_response(dumps({
+            'users': projection.to_dicts(users.items),
             'total': users.total,
             'pages': users.pages,
             'current_page': page,
             'per_page': per_page
-        }), 200
+        }))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -149,6 +173,8 @@ def update_user_role(user_id):
         user = User.query.get_or_404(user_id)
         user.role = role_enum
         db.session.commit()
+        # Tokens with permission claims keep the old role until they are refreshed
+        auth_service.principal_cache.invalidate(user_id)
         
         return jsonify({
             'message': 'User role updated successfully',
@@ -173,6 +199,7 @@ def update_user_status(user_id):
         user = User.query.get_or_404(user_id)
         user.is_active = bool(is_active)
         db.session.commit()
+        auth_service.principal_cache.invalidate(user_id)
         
         # Revoke all tokens if deactivating user
         if not is_active:
@@ -187,6 +214,12 @@ def update_user_status(user_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@auth_bp.route('/auth/cache-stats', methods=['GET'])
+@admin_required
+def get_auth_cache_stats():
+    """Get hit/miss counters for this worker's authenticated-user cache (admin only)"""
+    return jsonify(auth_service.principal_cache.stats()), 200
+
 @auth_bp.route('/auth/roles', methods=['GET'])
 @token_required
 def get_roles():
@@ -198,5 +231,6 @@ def get_roles():
 @token_required
 def get_permissions():
     """Get all available permissions"""
-    permissions = [{'value': perm.value, 'name': perm.name} for perm in Permission]
+    # 'bit' decodes the perms claim of access tokens
+    permissions = [{'value': perm.value, 'name': perm.name, 'bit': permission_engine.bits[perm]} for perm in Permission]
     return jsonify({'permissions': permissions}), 200
@@ -1,31 +1,124 @@
-from flask import Blueprint, jsonify, request, g
+import io
+from datetime import datetime
+from flask import Blueprint, jsonify, request, g, abort, current_app
+from sqlalchemy import select
 from src.models.book import Book, db
 from src.models.user import Permission
-from src.utils.auth_decorators import permission_required, optional_auth
-from sqlalchemy import or_
+from src.utils.auth_decorators import token_required, permission_required, optional_auth
+from src.services.suggest_index import suggest_index, DEFAULT_SUGGEST_LIMIT, MAX_SUGGEST_LIMIT
+from src.services.search_service import search_service, DEFAULT_FACET_LIMIT, MAX_FACET_LIMIT, DEFAULT_YEAR_BUCKET
+from src.services.stats_service import stats_service
+from src.services.import_service import import_service, IMPORT_FORMATS, DUPLICATE_MODES
+from src.services.loan_ledger import loan_ledger, parse_period_start, DEFAULT_TOP_LIMIT, HISTORY_ORDER
+from src.services.response_cache import response_cache, merge_json_object
+from src.services.circulation_service import (
+    circulation_service, CirculationError, MAX_BATCH_OPERATIONS,
+    DEFAULT_DUE_SOON_DAYS, DUE_REPORT_FIELDS, DUE_REPORT_ORDER
+)
+from src.utils.pagination import get_per_page, get_bool_arg, keyset_paginate, count_cache
+from src.utils.streaming import get_stream_format, stream_query
+from src.utils.serialization import dumps, parse_fields, Projection
+from src.utils.http_cache import make_etag, normalized_query_string, is_not_modified, not_modified, set_cache_headers
 
 book_bp = Blueprint('book', __name__)
 
+# Keyset pagination orderings; each ends in the primary key so it is unique
+BOOK_SORT_KEYS = {
+    'id': (Book.id,),
+    'title': (Book.title, Book.id)
+}
+
+def _json_response(body):
+    return current_app.response_class(body, mimetype='application/json')
+
+def _facets(query):
+    """Facet counts for ``query`` when ``?facets=1`` was passed, else None; raises ValueError for invalid arguments"""
+    if not get_bool_arg('facets'):
+        return None
+    limit = request.args.get('facet_limit', DEFAULT_FACET_LIMIT, type=int)
+    year_bucket = request.args.get('year_bucket', DEFAULT_YEAR_BUCKET, type=int)
+    if not 1 <= limit <= MAX_FACET_LIMIT:
+        raise ValueError(f'facet_limit must be between 1 and {MAX_FACET_LIMIT}')
+    if not 1 <= year_bucket <= 100:
+        raise ValueError('year_bucket must be between 1 and 100')
+    return search_service.facet_counts(query, limit=limit, year_bucket=year_bucket)
+
+def _catalog_etag(name, stream_format=None):
+    """ETag and Last-Modified for a catalog listing, from the catalog version stamp.
+
+    ``stream_format`` is part of the ETag so a JSON body and a stream of
+    the same URL never validate each other.
+    """
+    version, last_modified = stats_service.catalog_version()
+    role = g.current_user.role.value if g.current_user else 'anonymous'
+    return version, make_etag(name, version, normalized_query_string(), role, stream_format), last_modified
+
 @book_bp.route('/books', methods=['GET'])
 @optional_auth
 def get_books():
-    """Get all books with optional search functionality"""
+    """Get all books with optional search functionality.
+
+    Passing ``cursor`` (empty for the first page) switches to keyset
+    pagination ordered by ``sort`` (``id`` or ``title``); the total is then
+    only included with ``with_total=1``. ``fields`` limits the columns
+    selected and returned. ``facets=1`` adds facet counts for the whole
+    search, not just the page.
+    """
+    version, etag, last_modified = _catalog_etag('books')
+    if is_not_modified(etag, last_modified):
+        return not_modified(etag, last_modified)
+    
+    cache_key = response_cache.key('books', version)
+    body = response_cache.get(cache_key)
+    if body is None:
+        try:
+            response_data = _list_books(version)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        body = dumps(response_data)
+        response_cache.set(cache_key, body)
+    
+    # Add user info if authenticated (kept out of the shared cached body)
+    if g.current_user:
+        body = merge_json_object(body, dumps({'user_permissions': g.current_user.permission_names()}))
+    
+    return set_cache_headers(_json_response(body), etag, last_modified)
+
+def _list_books(version):
+    """Build the get_books payload; raises ValueError for invalid arguments"""
     search = request.args.get('search', '')
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
-    
-    query = Book.query
-    
-    if search:
-        # Search in title, author, genre, and description
-        search_filter = or_(
-            Book.title.ilike(f'%{search}%'),
-            Book.author.ilike(f'%{search}%'),
-            Book.genre.ilike(f'%{search}%'),
-            Book.description.ilike(f'%{search}%'),
-            Book.isbn.ilike(f'%{search}%')
+    per_page = get_per_page()
+    cursor = request.args.get('cursor')
+    fields = parse_fields(Book)
+    
+    if cursor is not None:
+        sort_key = request.args.get('sort', 'id')
+        if sort_key not in BOOK_SORT_KEYS:
+            raise ValueError(f"Invalid sort, expected one of: {', '.join(BOOK_SORT_KEYS)}")
+        
+        # Sort columns are always selected so the next cursor can be built
+        projection = Projection(Book, fields, extra_columns=BOOK_SORT_KEYS[sort_key])
+        query = search_service.filter_query(projection.query(), search=search, ranked=False)
+        rows, next_cursor = keyset_paginate(
+            query, BOOK_SORT_KEYS[sort_key], per_page, cursor=cursor, sort_key=sort_key
         )
-        query = query.filter(search_filter)
+        
+        response_data = {
+            'books': projection.to_dicts(rows),
+            'next_cursor': next_cursor,
+            'per_page': per_page
+        }
+        if get_bool_arg('with_total'):
+            response_data['total'] = count_cache.count(query, version=version)
+        facets = _facets(query)
+        if facets is not None:
+            response_data['facets'] = facets
+        return response_data
+    
+    # Search in title, author, genre, description and ISBN, best matches first
+    projection = Projection(Book, fields)
+    query = search_service.filter_query(projection.query(), search=search)
     
     # Pagination
     books = query.paginate(
@@ -35,52 +128,31 @@ def get_books():
     )
     
     response_data = {
-        'books': [book.to_dict() for book in books.items],
+        'books': projection.to_dicts(books.items),
         'total': books.total,
         'pages': books.pages,
         'current_page': page,
         'per_page': per_page
     }
-    
-    # Add user info if authenticated
-    if g.current_user:
-        response_data['user_permissions'] = [perm.value for perm in Permission if g.current_user.has_permission(perm)]
-    
-    return jsonify(response_data)
+    facets = _facets(query)
+    if facets is not None:
+        response_data['facets'] = facets
+    return response_data
 
 @book_bp.route('/books', methods=['POST'])
 @permission_required(Permission.CREATE_BOOK)
 def create_book():
     """Add a new book to the library"""
     try:
-        print(f"Received request: {request.method}")
-        print(f"Content-Type: {request.content_type}")
-        print(f"Request data: {request.data}")
-        print(f"User: {g.current_user.email} ({g.current_user.role.value})")
-        
-        data = request.json
-        print(f"Parsed JSON: {data}")
+        values, error = Book.validate_data(request.json)
+        if error:
+            return jsonify({'error': error}), 400
         
-        # Validate required fields
-        if not data.get('title') or not data.get('author'):
-            print("Validation failed: Missing title or author")
-            return jsonify({'error': 'Title and author are required'}), 400
-        
-        print(f"Creating book with title: {data['title']}, author: {data['author']}")
-        
-        book = Book(
-            title=data['title'],
-            author=data['author'],
-            isbn=data.get('isbn') if data.get('isbn') and data.get('isbn').strip() else None,
-            genre=data.get('genre'),
-            publication_year=data.get('publication_year'),
-            description=data.get('description')
-        )
-        
-        print("Book object created, adding to database...")
+        book = Book(**values)
         db.session.add(book)
         db.session.commit()
-        print("Book successfully added to database")
+        response_cache.invalidate()
+        suggest_index.put(book.id, book.title, book.author, book.isbn)
         
         return jsonify({
             'message': 'Book created successfully',
@@ -93,12 +165,77 @@ def create_book():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@book_bp.route('/books/import', methods=['POST'])
+@permission_required(Permission.CREATE_BOOK)
+def import_books():
+    """Bulk import books from a CSV or NDJSON request body.
+
+    The body is read as a stream and written in batches; the response is a
+    report with created/updated/skipped/failed counts and per-row errors.
+    """
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    on_duplicate = request.args.get('on_duplicate', 'skip')
+    batch_size = request.args.get('batch_size', 1000, type=int)
+    
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': f"Invalid format, expected one of: {', '.join(IMPORT_FORMATS)}"}), 400
+    if on_duplicate not in DUPLICATE_MODES:
+        return jsonify({'error': f"Invalid on_duplicate, expected one of: {', '.join(DUPLICATE_MODES)}"}), 400
+    if on_duplicate == 'upsert' and not g.current_user.has_permission(Permission.UPDATE_BOOK):
+        return jsonify({
+            'error': 'Insufficient permissions',
+            'required_permission': Permission.UPDATE_BOOK.value
+        }), 403
+    
+    try:
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        report = import_service.import_books(stream, fmt, on_duplicate=on_duplicate, batch_size=max(1, min(batch_size, 5000)))
+        if report['created'] or report['updated']:
+            response_cache.invalidate()
+        return jsonify(report), 200
+    
+    except UnicodeDecodeError as e:
+        db.session.rollback()
+        return jsonify({'error': f'Request body is not valid UTF-8: {e}'}), 400
+
+def _book_stamp(book):
+    """``(last_modified, version stamp)`` for one book; rows written without timestamps use the catalog version"""
+    last_modified = book.updated_at or book.created_at
+    if last_modified is not None:
+        return last_modified, last_modified.isoformat()
+    return None, f'catalog-{stats_service.catalog_version()[0]}'
+
 @book_bp.route('/books/<int:book_id>', methods=['GET'])
 @optional_auth
 def get_book(book_id):
-    """Get a specific book by ID"""
-    book = Book.query.get_or_404(book_id)
-    return jsonify(book.to_dict())
+    """Get a specific book by ID.
+    
+    The ETag comes from ``updated_at``, which is read on its own first so a
+    matching If-None-Match/If-Modified-Since is answered without loading
+    or serializing the book. Rows without one fall back to ``created_at``
+    and then to the catalog version.
+    """
+    row = db.session.execute(
+        select(Book.id, Book.updated_at, Book.created_at).where(Book.id == book_id)
+    ).first()
+    if row is None:
+        abort(404)
+    updated_at, stamp = _book_stamp(row)
+    etag = make_etag('book', book_id, stamp)
+    if is_not_modified(etag, updated_at):
+        return not_modified(etag, updated_at)
+    
+    body = response_cache.get(f'book:{book_id}:{stamp}')
+    if body is None:
+        book = db.session.get(Book, book_id)
+        if book is None:
+            abort(404)
+        updated_at, stamp = _book_stamp(book)
+        etag = make_etag('book', book_id, stamp)
+        body = dumps(book.to_dict())
+        response_cache.set(f'book:{book_id}:{stamp}', body)
+    
+    return set_cache_headers(_json_response(body), etag, updated_at)
 
 @book_bp.route('/books/<int:book_id>', methods=['PUT'])
 @permission_required(Permission.UPDATE_BOOK)
@@ -117,6 +254,8 @@ def update_book(book_id):
         book.description = data.get('description', book.description)
         
         db.session.commit()
+        response_cache.invalidate()
+        suggest_index.put(book.id, book.title, book.author, book.isbn)
         return jsonify(book.to_dict())
     
     except Exception as e:
@@ -136,6 +275,8 @@ def delete_book(book_id):
         
         db.session.delete(book)
         db.session.commit()
+        response_cache.invalidate()
+        suggest_index.remove(book_id)
         return '', 204
     
     except Exception as e:
@@ -147,28 +288,26 @@ def delete_book(book_id):
 def checkout_book(book_id):
     """Check out a book to a borrower"""
     try:
-        book = Book.query.get_or_404(book_id)
-        data = request.json
+        data = request.json or {}
         
-        # Validate required fields
-        if not data.get('borrower_name') or not data.get('borrower_email'):
-            return jsonify({'error': 'Borrower name and email are required'}), 400
-        
-        success, message = book.checkout(
-            borrower_name=data['borrower_name'],
-            borrower_email=data['borrower_email'],
+        circulation_service.checkout(
+            book_id,
+            borrower_name=data.get('borrower_name'),
+            borrower_email=data.get('borrower_email'),
             days=data.get('days', 14)
         )
-        
-        if not success:
-            return jsonify({'error': message}), 400
-        
         db.session.commit()
+        response_cache.invalidate()
+        
+        book = db.session.get(Book, book_id, populate_existing=True)
         return jsonify({
-            'message': message,
+            'message': 'Book checked out successfully',
             'book': book.to_dict()
         })
     
+    except CirculationError as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -178,17 +317,50 @@ def checkout_book(book_id):
 def checkin_book(book_id):
     """Check in a book (return it)"""
     try:
-        book = Book.query.get_or_404(book_id)
+        circulation_service.checkin(book_id)
+        db.session.commit()
+        response_cache.invalidate()
+        
+        book = db.session.get(Book, book_id, populate_existing=True)
+        return jsonify({
+            'message': 'Book checked in successfully',
+            'book': book.to_dict()
+        })
+    
+    except CirculationError as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@book_bp.route('/books/circulation', methods=['POST'])
+@token_required
+def batch_circulation():
+    """Apply many checkouts and check-ins in one transaction.
+    
+    Each operation needs the matching checkout/checkin permission and is
+    reported individually. With ``"atomic": true`` any failure rolls back
+    the whole batch.
+    """
+    try:
+        data = request.json or {}
+        operations = data.get('operations')
         
-        success, message = book.checkin()
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'error': 'operations must be a non-empty list'}), 400
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations are allowed per request'}), 400
         
-        if not success:
-            return jsonify({'error': message}), 400
+        results = circulation_service.process_batch(operations, g.current_user, atomic=bool(data.get('atomic')))
+        succeeded = sum(1 for result in results if result['success'])
+        if succeeded:
+            response_cache.invalidate()
         
-        db.session.commit()
         return jsonify({
-            'message': message,
-            'book': book.to_dict()
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results
         })
     
     except Exception as e:
@@ -198,44 +370,195 @@ def checkin_book(book_id):
 @book_bp.route('/books/search', methods=['GET'])
 @optional_auth
 def search_books():
-    """Advanced search for books"""
+    """Advanced search for books.
+
+    ``?facets=1`` wraps the results as ``{"books": [...], "facets": {...}}``
+    with genre, author, publication-year and availability counts. With
+    ``?format=ndjson|csv`` (or ``Accept: application/x-ndjson``) the
+    results are streamed instead; with no filters this exports the catalog.
+    """
     title = request.args.get('title', '')
     author = request.args.get('author', '')
     genre = request.args.get('genre', '')
     isbn = request.args.get('isbn', '')
     available_only = request.args.get('available_only', 'false').lower() == 'true'
     
-    query = Book.query
+    # The format can come from the Accept header, so caches must key on it too
+    stream_format = get_stream_format()
+    version, etag, last_modified = _catalog_etag('books-search', stream_format)
+    if is_not_modified(etag, last_modified):
+        return not_modified(etag, last_modified, vary=('Accept',))
+    
+    cache_key = response_cache.key('books-search', version, stream_format)
+    if not stream_format:
+        body = response_cache.get(cache_key)
+        if body is not None:
+            return set_cache_headers(_json_response(body), etag, last_modified, vary=('Accept',))
+    
+    try:
+        projection = Projection(Book, parse_fields(Book))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = search_service.filter_query(
+        projection.query(),
+        title=title,
+        author=author,
+        genre=genre,
+        isbn=isbn
+    )
     
-    if title:
-        query = query.filter(Book.title.ilike(f'%{title}%'))
-    if author:
-        query = query.filter(Book.author.ilike(f'%{author}%'))
-    if genre:
-        query = query.filter(Book.genre.ilike(f'%{genre}%'))
-    if isbn:
-        query = query.filter(Book.isbn.ilike(f'%{isbn}%'))
     if available_only:
         query = query.filter(Book.is_checked_out == False)
     
-    books = query.all()
-    return jsonify([book.to_dict() for book in books])
+    if stream_format:
+        # Appended after any relevance ordering so exports are deterministic
+        response = stream_query(
+            query.order_by(Book.id), projection.to_dict, projection.names, stream_format, filename='books'
+        )
+        return set_cache_headers(response, etag, last_modified, vary=('Accept',))
+    
+    try:
+        facets = _facets(query)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    books = projection.to_dicts(query.all())
+    # Facets turn the bare list into an object so both fit in one response
+    body = dumps(books if facets is None else {'books': books, 'facets': facets})
+    response_cache.set(cache_key, body)
+    return set_cache_headers(_json_response(body), etag, last_modified, vary=('Accept',))
 
 @book_bp.route('/books/stats', methods=['GET'])
 @permission_required(Permission.VIEW_LIBRARY_STATS)
 def get_library_stats():
     """Get library statistics"""
-    total_books = Book.query.count()
-    checked_out_books = Book.query.filter(Book.is_checked_out == True).count()
-    available_books = total_books - checked_out_books
-    overdue_books = Book.query.filter(
-        Book.is_checked_out == True,
-        Book.due_date < db.func.datetime('now')
-    ).count()
+    return jsonify(stats_service.get_stats())
+
+@book_bp.route('/books/overdue', methods=['GET'])
+@permission_required(Permission.VIEW_LIBRARY_STATS)
+def get_overdue_report():
+    """Overdue and due-soon books grouped by borrower.
+
+    ``window`` is ``overdue`` (default), ``due_soon`` or ``all``; the last
+    two cover the next ``days`` days. Pages follow ``cursor`` like the
+    keyset listing of ``/books``, so a borrower's books may continue on the
+    next page. With ``?format=ndjson|csv`` the whole report is streamed as
+    flat rows in the same order.
+    """
+    window = request.args.get('window', 'overdue')
+    days = request.args.get('days', DEFAULT_DUE_SOON_DAYS, type=int)
+    per_page = get_per_page()
+    now = datetime.utcnow()
+    
+    try:
+        projection, query = circulation_service.due_report(window, days, now)
+    except CirculationError as e:
+        return jsonify({'error': e.message}), e.status_code
+    
+    def serialize(row):
+        return circulation_service.due_report_row(projection, row, now)
+    
+    stream_format = get_stream_format()
+    if stream_format:
+        return stream_query(
+            query.order_by(*DUE_REPORT_ORDER), serialize, DUE_REPORT_FIELDS, stream_format, filename=window
+        )
+    
+    try:
+        rows, next_cursor = keyset_paginate(
+            query, DUE_REPORT_ORDER, per_page, cursor=request.args.get('cursor', ''), sort_key='due'
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    borrowers = []
+    for row in rows:
+        if not borrowers or borrowers[-1]['borrower_email'] != row.borrower_email:
+            borrowers.append({'borrower_email': row.borrower_email, 'borrower_name': row.borrower_name, 'books': []})
+        book = serialize(row)
+        del book['borrower_email'], book['borrower_name']
+        borrowers[-1]['books'].append(book)
+    
+    return _json_response(dumps({
+        'window': window,
+        'as_of': now,
+        'borrowers': borrowers,
+        'next_cursor': next_cursor,
+        'per_page': per_page
+    }))
+
+@book_bp.route('/books/loans', methods=['GET'])
+@permission_required(Permission.VIEW_LIBRARY_STATS)
+def get_loan_history():
+    """Loan ledger events, oldest first, optionally for one book or borrower.
+
+    ``since`` and ``until`` (ISO timestamps) bound ``occurred_at``. Pages
+    follow ``cursor`` like the keyset listing of ``/books``.
+    """
+    since = request.args.get('since')
+    until = request.args.get('until')
+    try:
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+    except ValueError:
+        return jsonify({'error': 'since and until must be ISO 8601 timestamps'}), 400
+    
+    query = loan_ledger.history_query(
+        book_id=request.args.get('book_id', type=int),
+        borrower_email=request.args.get('borrower_email'),
+        since=since,
+        until=until
+    )
+    
+    per_page = get_per_page()
+    try:
+        events, next_cursor = keyset_paginate(
+            query, HISTORY_ORDER, per_page, cursor=request.args.get('cursor', ''), sort_key='loans'
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
-        'total_books': total_books,
-        'available_books': available_books,
-        'checked_out_books': checked_out_books,
-        'overdue_books': overdue_books
+        'events': [event.to_dict() for event in events],
+        'next_cursor': next_cursor,
+        'per_page': per_page
     })
+
+@book_bp.route('/books/loans/top', methods=['GET'])
+@permission_required(Permission.VIEW_LIBRARY_STATS)
+def get_top_loans():
+    """Most borrowed books, genres or borrowers in a day or month, from the loan rollups"""
+    dimension = request.args.get('by', 'book')
+    period = request.args.get('period', 'month')
+    limit = request.args.get('limit', DEFAULT_TOP_LIMIT, type=int)
+    
+    try:
+        start = parse_period_start(period, request.args.get('date'))
+        results = loan_ledger.top(dimension, period, start, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'by': dimension,
+        'period': period,
+        'period_start': start.isoformat(),
+        'results': results
+    })
+
+@book_bp.route('/books/suggest', methods=['GET'])
+def suggest_books():
+    """Typeahead suggestions for a search box, from the in-memory suggestion index"""
+    limit = max(1, min(request.args.get('limit', DEFAULT_SUGGEST_LIMIT, type=int), MAX_SUGGEST_LIMIT))
+    suggestions = suggest_index.suggest(request.args.get('q', ''), limit)
+    if suggestions is None:
+        response = jsonify({'error': 'Suggestions are still loading'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    return jsonify({'suggestions': suggestions})
+
+@book_bp.route('/books/suggest/stats', methods=['GET'])
+@permission_required(Permission.VIEW_LIBRARY_STATS)
+def get_suggest_stats():
+    """Size and memory footprint of this worker's suggestion index"""
+    return jsonify(suggest_index.stats())
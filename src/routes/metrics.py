@@ -0,0 +1,22 @@
+import hmac
+from flask import Blueprint, current_app, request, jsonify
+from src.services.metrics import metrics, CONTENT_TYPE
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint covering every gunicorn worker.
+
+    When ``METRICS_TOKEN`` is configured, scrapers must send it as a
+    bearer token.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        auth_header = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(auth_header.encode(), f'Bearer {token}'.encode()):
+            return jsonify({'error': 'Metrics token is missing or invalid'}), 401
+    
+    response = current_app.response_class(metrics.render(), content_type=CONTENT_TYPE)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
@@ -1,10 +1,18 @@
 from flask import Blueprint, jsonify, request
 from src.models.user import User, db
+from src.services.auth_service import auth_service
+from src.utils.streaming import get_stream_format, stream_query
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/users', methods=['GET'])
 def get_users():
+    stream_format = get_stream_format()
+    if stream_format:
+        return stream_query(
+            User.query.order_by(User.id), User.to_dict, User.FIELDS, stream_format, filename='users'
+        )
+    
     users = User.query.all()
     return jsonify([user.to_dict() for user in users])
 
@@ -29,6 +37,7 @@ def update_user(user_id):
     user.username = data.get('username', user.username)
     user.email = data.get('email', user.email)
     db.session.commit()
+    auth_service.principal_cache.invalidate(user_id)
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
@@ -36,4 +45,5 @@ def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    auth_service.principal_cache.invalidate(user_id)
     return '', 204
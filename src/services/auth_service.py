@@ -1,14 +1,36 @@
-import os
 import jwt
 import secrets
+import time
 from datetime import datetime, timedelta
-from google.auth.transport import requests
-from google.oauth2 import id_token
-from src.models.user import User, RefreshToken, UserRole, db
+from sqlalchemy import select, update
+from src.models.user import User, RefreshToken, UserRole, db, permission_engine
+from src.services.principal_cache import PrincipalCache, AuthenticatedUser
+from src.services.google_keys import GoogleKeyCache, KeyFetchError, GOOGLE_CERTS_URL
+from src.services.metrics import metrics
+from src.services.write_behind import write_behind
+
+def revoke_tokens_statement(user_id):
+    """UPDATE revoking every live refresh token of a user"""
+    return (
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.is_revoked == False)
+        .values(is_revoked=True)
+    )
+
+def refresh_token_statement(token_string, live_only=False):
+    """SELECT of the refresh token row for a token string, looked up by its hash"""
+    statement = select(RefreshToken).where(RefreshToken.token_hash == RefreshToken.hash_token(token_string))
+    if live_only:
+        statement = statement.where(RefreshToken.is_revoked == False)
+    return statement
 
 class AuthService:
     def __init__(self, app=None):
         self.app = app
+        self.principal_cache = PrincipalCache()
+        self.google_keys = GoogleKeyCache()
+        self.admin_emails = frozenset()
+        self.librarian_emails = frozenset()
         if app:
             self.init_app(app)
     
@@ -16,16 +38,40 @@ class AuthService:
         self.app = app
         self.jwt_secret = app.config.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
         self.google_client_id = app.config.get('GOOGLE_CLIENT_ID')
+        self.admin_emails = _email_set(app.config.get('ADMIN_EMAILS', ''))
+        self.librarian_emails = _email_set(app.config.get('LIBRARIAN_EMAILS', ''))
         self.access_token_expires = timedelta(hours=1)
         self.refresh_token_expires = timedelta(days=30)
+        # Put the permission bitmask in access tokens and authorize from it alone
+        self.permission_claims = app.config.get('AUTH_PERMISSION_CLAIMS', False)
+        self.principal_cache = PrincipalCache(
+            ttl=app.config.get('AUTH_CACHE_TTL', 30),
+            max_entries=app.config.get('AUTH_CACHE_SIZE', 10000)
+        )
+        self.google_keys = GoogleKeyCache(
+            certs_url=app.config.get('GOOGLE_CERTS_URL') or GOOGLE_CERTS_URL,
+            wait_timeout=app.config.get('GOOGLE_KEYS_WAIT_TIMEOUT', 3)
+        )
     
     def verify_google_token(self, token):
-        """Verify Google OAuth token and return user info"""
+        """Verify Google OAuth token and return user info.
+        
+        Returns None for invalid tokens; raises KeyFetchError when Google's
+        signing keys are unavailable, which is not the caller's fault.
+        """
+        start = time.perf_counter()
         try:
-            # Verify the token with Google
-            idinfo = id_token.verify_oauth2_token(
-                token, requests.Request(), self.google_client_id
-            )
+            user_info = self._verify_google_token(token)
+        except KeyFetchError:
+            metrics.token_verified('google', time.perf_counter() - start, 'unavailable')
+            raise
+        metrics.token_verified('google', time.perf_counter() - start, 'ok' if user_info is not None else 'rejected')
+        return user_info
+    
+    def _verify_google_token(self, token):
+        try:
+            # Verify the token locally against Google's cached signing keys
+            idinfo = self.google_keys.verify(token, self.google_client_id)
             
             # Check if the token is from the correct issuer
             if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
@@ -42,47 +88,75 @@ class AuthService:
             return None
     
     def determine_user_role(self, email):
-        """Determine user role based on environment variables"""
-        # Get email lists from environment variables
-        admin_emails = os.environ.get('ADMIN_EMAILS', '').split(',')
-        librarian_emails = os.environ.get('LIBRARIAN_EMAILS', '').split(',')
-        
-        # Clean up emails (remove whitespace)
-        admin_emails = [email.strip() for email in admin_emails if email.strip()]
-        librarian_emails = [email.strip() for email in librarian_emails if email.strip()]
-        
-        # Check role based on email
-        if email in admin_emails:
+        """Determine user role from the ADMIN_EMAILS/LIBRARIAN_EMAILS sets compiled at startup"""
+        if email in self.admin_emails:
             return UserRole.ADMIN
-        elif email in librarian_emails:
+        elif email in self.librarian_emails:
             return UserRole.LIBRARIAN
         else:
             return UserRole.MEMBER
     
-    def create_or_update_user(self, user_info):
-        """Create a new user or update existing user from Google OAuth"""
+    def login(self, user_info):
+        """Sign in a verified Google user with a single commit.
+        
+        Creates or updates the user, re-applies the role rules (in case the
+        email lists changed), rotates the refresh token and issues an access
+        token. ``last_login`` of existing users goes through the write-behind
+        buffer instead of this transaction. Returns a dict with
+        ``access_token``, ``refresh_token`` and the ``user`` as a dict.
+        """
+        now = datetime.utcnow()
         user = User.query.filter_by(email=user_info['email']).first()
+        role = self.determine_user_role(user_info['email'])
+        role_changed = False
+        created = user is None
         
         if user:
-            # Update existing user
-            user.name = user_info['name']
-            user.profile_picture = user_info['profile_picture']
-            user.google_id = user_info['google_id']
-            user.updated_at = datetime.utcnow()
+            # Only changed fields are written, so a repeat login updates no user row
+            profile = {
+                'name': user_info['name'],
+                'profile_picture': user_info['profile_picture'],
+                'google_id': user_info['google_id']
+            }
+            changed = {key: value for key, value in profile.items() if getattr(user, key) != value}
+            for key, value in changed.items():
+                setattr(user, key, value)
+            if user.role != role:
+                user.role = role
+                role_changed = True
+            if changed or role_changed:
+                user.updated_at = now
         else:
-            # Create new user
             user = User(
                 email=user_info['email'],
                 name=user_info['name'],
                 google_id=user_info['google_id'],
                 profile_picture=user_info['profile_picture'],
-                role=self.determine_user_role(user_info['email'])  # Determine role based on email
+                role=role,
+                last_login=now
             )
             db.session.add(user)
+            db.session.flush()  # Assigns user.id
         
-        user.update_last_login()
+        refresh_token = self.issue_refresh_token(user)
+        access_token = self.generate_access_token(user)
+        # Built before the commit, which would expire the object and reload it
+        user_data = user.to_dict()
+        user_data['last_login'] = now.isoformat()
+        user_id = user.id
         db.session.commit()
-        return user
+        
+        if not created:
+            write_behind.record(User.last_login, user_id, now)
+        if role_changed:
+            self.principal_cache.invalidate(user_id)
+            print(f"Updated role for {user_data['email']} to {role.value}")
+        
+        return {
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'user': user_data
+        }
     
     def generate_access_token(self, user):
         """Generate JWT access token"""
@@ -94,40 +168,71 @@ class AuthService:
             'iat': datetime.utcnow(),
             'type': 'access'
         }
+        if self.permission_claims:
+            payload['perms'] = permission_engine.mask(user.role)
         
         return jwt.encode(payload, self.jwt_secret, algorithm='HS256')
     
     def generate_refresh_token(self, user):
         """Generate and store refresh token"""
+        token_string = self.issue_refresh_token(user)
+        db.session.commit()
+        return token_string
+    
+    def issue_refresh_token(self, user):
+        """Revoke the user's refresh tokens and add a new one, in the caller's transaction"""
         # Revoke existing refresh tokens for this user
-        RefreshToken.query.filter_by(user_id=user.id, is_revoked=False).update({'is_revoked': True})
+        db.session.execute(revoke_tokens_statement(user.id))
         
         # Generate new refresh token
         token_string = secrets.token_urlsafe(64)
         refresh_token = RefreshToken(
             user_id=user.id,
-            token=token_string,
+            token_hash=RefreshToken.hash_token(token_string),
             expires_at=datetime.utcnow() + self.refresh_token_expires
         )
         
         db.session.add(refresh_token)
-        db.session.commit()
         
         return token_string
     
     def verify_access_token(self, token):
-        """Verify JWT access token and return user info"""
+        """Verify JWT access token and return the authenticated user.
+        
+        Returns an AuthenticatedUser served from the principal cache when
+        possible, so most requests are authorized without touching the database.
+        With AUTH_PERMISSION_CLAIMS, tokens carrying a ``perms`` claim are
+        authorized from their claims alone.
+        """
+        start = time.perf_counter()
+        principal = self._verify_access_token(token)
+        metrics.token_verified('access', time.perf_counter() - start, 'ok' if principal is not None else 'rejected')
+        return principal
+    
+    def _verify_access_token(self, token):
         try:
             payload = jwt.decode(token, self.jwt_secret, algorithms=['HS256'])
             
             if payload.get('type') != 'access':
                 return None
             
-            user = User.query.get(payload['user_id'])
-            if not user or not user.is_active:
+            if self.permission_claims and 'perms' in payload:
+                # Trusted until the token expires: no cache or database lookup
+                return AuthenticatedUser.from_claims(payload)
+            
+            principal = self.principal_cache.get(payload['user_id'])
+            metrics.auth_cache_lookup(principal is not None)
+            if principal is None:
+                user = db.session.get(User, payload['user_id'])
+                if not user:
+                    return None
+                principal = AuthenticatedUser.from_user(user)
+                self.principal_cache.put(principal)
+            
+            if not principal.is_active:
                 return None
             
-            return user
+            return principal
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
@@ -135,10 +240,9 @@ class AuthService:
     
     def refresh_access_token(self, refresh_token_string):
         """Generate new access token using refresh token"""
-        refresh_token = RefreshToken.query.filter_by(
-            token=refresh_token_string,
-            is_revoked=False
-        ).first()
+        refresh_token = db.session.execute(
+            refresh_token_statement(refresh_token_string, live_only=True)
+        ).scalars().first()
         
         if not refresh_token or not refresh_token.is_valid():
             return None
@@ -157,7 +261,7 @@ class AuthService:
     
     def revoke_refresh_token(self, refresh_token_string):
         """Revoke a refresh token"""
-        refresh_token = RefreshToken.query.filter_by(token=refresh_token_string).first()
+        refresh_token = db.session.execute(refresh_token_statement(refresh_token_string)).scalars().first()
         if refresh_token:
             refresh_token.revoke()
             return True
@@ -165,8 +269,26 @@ class AuthService:
     
     def revoke_all_user_tokens(self, user_id):
         """Revoke all refresh tokens for a user"""
-        RefreshToken.query.filter_by(user_id=user_id, is_revoked=False).update({'is_revoked': True})
+        db.session.execute(revoke_tokens_statement(user_id))
         db.session.commit()
+        self.principal_cache.invalidate(user_id)
+    
+    def ensure_default_admin(self):
+        """Create the default admin user if no users exist (requires app context)"""
+        if User.query.first() is not None:
+            return None
+        admin_user = User(
+            email='admin@library.com',
+            name='System Administrator',
+            role=UserRole.ADMIN
+        )
+        db.session.add(admin_user)
+        db.session.commit()
+        return admin_user
+
+def _email_set(value):
+    """Comma-separated emails as a frozenset, whitespace and empty entries dropped"""
+    return frozenset(email.strip() for email in value.split(',') if email.strip())
 
 # Global auth service instance
 auth_service = AuthService()
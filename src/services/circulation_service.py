@@ -0,0 +1,200 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from src.models.book import Book
+from src.models.user import Permission, db
+from src.utils.serialization import Projection
+from src.services.stats_service import stats_service
+from src.services.loan_ledger import loan_ledger
+
+CIRCULATION_ACTIONS = ('checkout', 'checkin')
+DEFAULT_LOAN_DAYS = 14
+MAX_LOAN_DAYS = 90
+MAX_BATCH_OPERATIONS = 500
+
+DUE_REPORT_WINDOWS = ('overdue', 'due_soon', 'all')
+DEFAULT_DUE_SOON_DAYS = 7
+# Report rows, in output order (also the CSV columns)
+DUE_REPORT_FIELDS = (
+    'id', 'title', 'author', 'isbn', 'borrower_name', 'borrower_email',
+    'checkout_date', 'due_date', 'days_overdue'
+)
+# Groups rows by borrower, earliest due first; ends in the primary key so it is unique
+DUE_REPORT_ORDER = (Book.borrower_email, Book.due_date, Book.id)
+
+ACTION_PERMISSIONS = {
+    'checkout': Permission.CHECKOUT_BOOK,
+    'checkin': Permission.CHECKIN_BOOK
+}
+
+
+class CirculationError(Exception):
+    """A checkout or check-in that could not be applied"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class CirculationService:
+    """Checkouts and check-ins as single conditional UPDATE statements.
+
+    ``UPDATE book SET ... WHERE id = :id AND is_checked_out = :expected``
+    either applies or matches no row, so two concurrent requests for the
+    same copy cannot both succeed. Each successful operation is appended to
+    the loan ledger in the same transaction. Callers own the transaction:
+    run as many operations as needed, then commit once.
+    """
+
+    def checkout(self, book_id, borrower_name, borrower_email, days=DEFAULT_LOAN_DAYS):
+        """Check out a book; returns the due date or raises CirculationError"""
+        if not borrower_name or not borrower_email:
+            raise CirculationError('Borrower name and email are required')
+        days = self._loan_days(days)
+
+        now = datetime.utcnow()
+        due_date = now + timedelta(days=days)
+        self._apply(book_id, expected_checked_out=False, values={
+            'is_checked_out': True,
+            'borrower_name': borrower_name,
+            'borrower_email': borrower_email,
+            'checkout_date': now,
+            'due_date': due_date,
+            'updated_at': now
+        })
+        genre = db.session.execute(select(Book.genre).where(Book.id == book_id)).scalar()
+        loan_ledger.record_checkout(db.session.connection(), book_id, borrower_email, genre, now, due_date)
+        return due_date
+
+    def checkin(self, book_id):
+        """Check in a book or raise CirculationError"""
+        # The update clears the borrower, so read it first; matching it in the
+        # UPDATE keeps the ledger right if the copy changed hands in between
+        borrower_email = db.session.execute(
+            select(Book.borrower_email).where(Book.id == book_id, Book.is_checked_out == True)
+        ).scalar()
+        now = datetime.utcnow()
+        self._apply(book_id, expected_checked_out=True, where=(Book.borrower_email == borrower_email,), values={
+            'is_checked_out': False,
+            'borrower_name': None,
+            'borrower_email': None,
+            'checkout_date': None,
+            'due_date': None,
+            'updated_at': now
+        })
+        loan_ledger.record_checkin(db.session.connection(), book_id, borrower_email, now)
+
+    def process_batch(self, operations, user, atomic=False):
+        """Apply a list of checkout/checkin operations in one transaction.
+
+        Returns one result per operation. Failed operations do not stop the
+        rest unless ``atomic`` is set, in which case any failure rolls back
+        the whole batch.
+        """
+        results = []
+        for index, operation in enumerate(operations):
+            result = {'index': index}
+            try:
+                if not isinstance(operation, dict):
+                    raise CirculationError('Operation must be an object')
+                action = operation.get('action')
+                book_id = operation.get('book_id')
+                result.update({'action': action, 'book_id': book_id})
+
+                if action not in CIRCULATION_ACTIONS:
+                    raise CirculationError(f"Invalid action, expected one of: {', '.join(CIRCULATION_ACTIONS)}")
+                if not isinstance(book_id, int) or isinstance(book_id, bool):
+                    raise CirculationError('book_id must be an integer')
+                if not user.has_permission(ACTION_PERMISSIONS[action]):
+                    raise CirculationError('Insufficient permissions', status_code=403)
+
+                if action == 'checkout':
+                    due_date = self.checkout(
+                        book_id,
+                        operation.get('borrower_name'),
+                        operation.get('borrower_email'),
+                        operation.get('days', DEFAULT_LOAN_DAYS)
+                    )
+                    result.update({'success': True, 'message': 'Book checked out successfully',
+                                   'due_date': due_date.isoformat()})
+                else:
+                    self.checkin(book_id)
+                    result.update({'success': True, 'message': 'Book checked in successfully'})
+            except CirculationError as e:
+                result.update({'success': False, 'error': e.message})
+            results.append(result)
+
+        if atomic and not all(result['success'] for result in results):
+            db.session.rollback()
+            for result in results:
+                if result['success']:
+                    result.update({'success': False, 'error': 'Rolled back because another operation failed'})
+                    result.pop('message', None)
+                    result.pop('due_date', None)
+        else:
+            db.session.commit()
+        return results
+
+    def due_report(self, window='overdue', days=DEFAULT_DUE_SOON_DAYS, now=None):
+        """Return ``(projection, query)`` for checked-out books in a due-date window.
+
+        ``overdue`` is everything past due, ``due_soon`` what falls due in the
+        next ``days`` days and ``all`` both. The window is one range on
+        ``(is_checked_out, due_date)``, so only the matching rows are read;
+        callers order by ``DUE_REPORT_ORDER``. Raises CirculationError for
+        an invalid window.
+        """
+        if window not in DUE_REPORT_WINDOWS:
+            raise CirculationError(f"Invalid window, expected one of: {', '.join(DUE_REPORT_WINDOWS)}")
+        if window != 'overdue' and (isinstance(days, bool) or not isinstance(days, int)
+                                    or not 1 <= days <= MAX_LOAN_DAYS):
+            raise CirculationError(f'days must be an integer between 1 and {MAX_LOAN_DAYS}')
+
+        now = now or datetime.utcnow()
+        projection = Projection(Book, DUE_REPORT_FIELDS[:-1])
+        query = projection.query().filter(Book.is_checked_out == True)
+        if window == 'overdue':
+            query = query.filter(Book.due_date < now)
+        elif window == 'due_soon':
+            query = query.filter(Book.due_date >= now, Book.due_date < now + timedelta(days=days))
+        else:
+            query = query.filter(Book.due_date < now + timedelta(days=days))
+        return projection, query
+
+    @staticmethod
+    def due_report_row(projection, row, now):
+        """Report dict for a row of ``due_report``; ``days_overdue`` is 0 until the due date passes"""
+        data = projection.to_dict(row)
+        data['days_overdue'] = max((now - row.due_date).days, 0)
+        return data
+
+    def _apply(self, book_id, expected_checked_out, values, where=()):
+        result = db.session.execute(
+            update(Book)
+            .where(Book.id == book_id, Book.is_checked_out == expected_checked_out, *where)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            # Only failures pay for a second query to explain what went wrong
+            current = db.session.execute(select(Book.is_checked_out).where(Book.id == book_id)).first()
+            if current is None:
+                raise CirculationError('Book not found', status_code=404)
+            if current[0] == expected_checked_out:
+                raise CirculationError('Book changed during the update, please retry', status_code=409)
+            raise CirculationError('Book is already checked out' if current[0] else 'Book is not checked out')
+
+        # Bulk UPDATEs skip the ORM flush hooks, so adjust the counters here
+        stats_service.adjust(db.session.connection(), checked_out=1 if values['is_checked_out'] else -1)
+
+    @staticmethod
+    def _loan_days(days):
+        if days is None:
+            return DEFAULT_LOAN_DAYS
+        if isinstance(days, bool) or not isinstance(days, int) or not 1 <= days <= MAX_LOAN_DAYS:
+            raise CirculationError(f'days must be an integer between 1 and {MAX_LOAN_DAYS}')
+        return days
+
+
+# Global circulation service instance
+circulation_service = CirculationService()
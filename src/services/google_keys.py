@@ -0,0 +1,180 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class KeyFetchError(Exception):
+    """Raised when the signing keys cannot be fetched and none are cached"""
+
+
+class GoogleKeyCache:
+    """Process-wide cache of Google's ID-token signing certificates.
+
+    Certificates are fetched from ``certs_url`` (JSON mapping of key id to
+    x509 certificate, like Google's v1 endpoint) and kept for as long as
+    the response's ``Cache-Control: max-age`` allows. Shortly before they
+    expire a background refresh is started. ID tokens are then verified
+    locally against the cached certificates.
+
+    All HTTP requests run on one dedicated thread, so concurrent refreshes
+    are coalesced into a single request and the ``requests`` session is
+    never shared between threads. Request threads wait at most
+    ``wait_timeout`` seconds for keys they do not have yet, so a slow
+    certificate endpoint cannot hold every worker thread.
+    """
+
+    def __init__(self, certs_url=GOOGLE_CERTS_URL, refresh_margin=300, default_ttl=3600,
+                 error_ttl=60, min_force_interval=30, timeout=5, wait_timeout=3):
+        self.certs_url = certs_url
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self.error_ttl = error_ttl
+        self.min_force_interval = min_force_interval
+        self.timeout = timeout
+        self.wait_timeout = wait_timeout
+        self.session = None
+        self.fetches = 0
+        self._certs = None
+        self._fetched_at = 0.0
+        self._refresh_at = 0.0
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._pending = None
+
+    def verify(self, token, audience):
+        """Verify an ID token's signature, expiry and audience; return its claims.
+
+        Raises ValueError for invalid tokens and KeyFetchError when no
+        signing keys are available in time.
+        """
+        # Deferred: google.auth and its crypto backends are only needed
+        # once someone signs in, not to boot a worker
+        from google.auth import jwt as google_jwt
+
+        certs = self.get_certs()
+        key_id = google_jwt.decode_header(token).get('kid')
+        if key_id and key_id not in certs:
+            # Google rotated its keys before our copy expired
+            certs = self.refresh(force=True)
+        return google_jwt.decode(token, certs=certs, audience=audience)
+
+    def get_certs(self):
+        """Return the cached certificates, refreshing them if needed"""
+        with self._lock:
+            certs, refresh_at, expires_at = self._certs, self._refresh_at, self._expires_at
+
+        now = time.time()
+        if certs is not None and now < expires_at:
+            if now >= refresh_at:
+                self._start_background_refresh()
+            return certs
+        return self.refresh()
+
+    def refresh(self, force=False):
+        """Fetch the certificates, joining a fetch already in flight.
+
+        Waits up to ``wait_timeout`` seconds; on timeout the fetch carries
+        on in the background and the previous keys (if any) are returned.
+        """
+        requested_at = time.time()
+        with self._lock:
+            # Forced refreshes (unknown key id) are rate limited so forged
+            # tokens cannot turn into one outbound request each.
+            if force:
+                fresh = self._fetched_at >= requested_at - self.min_force_interval
+            else:
+                fresh = time.time() < self._refresh_at
+            if self._certs is not None and fresh:
+                return self._certs
+            future = self._submit()
+
+        try:
+            return future.result(timeout=self.wait_timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                if self._certs is not None:
+                    return self._certs
+            raise KeyFetchError(f"Timed out after {self.wait_timeout}s waiting for signing keys from {self.certs_url}")
+
+    def _submit(self):
+        # Caller holds self._lock
+        if self._pending is not None and not self._pending.done():
+            return self._pending
+        if self._executor is None or self._executor_pid != os.getpid():
+            # Threads do not survive fork(); each worker gets its own
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='google-keys')
+            self._executor_pid = os.getpid()
+        self._pending = self._executor.submit(self._refresh_now)
+        return self._pending
+
+    def _refresh_now(self):
+        import requests
+
+        try:
+            certs, ttl = self._fetch()
+        except (requests.RequestException, ValueError) as e:
+            with self._lock:
+                if self._certs is None:
+                    raise KeyFetchError(f"Could not fetch signing keys from {self.certs_url}: {e}")
+                # Keep serving the previous keys and retry soon
+                print(f"Signing key refresh failed, reusing cached keys: {e}")
+                self._refresh_at = time.time() + self.error_ttl
+                self._expires_at = max(self._expires_at, self._refresh_at)
+                return self._certs
+
+        with self._lock:
+            self._certs = certs
+            self._fetched_at = time.time()
+            self._expires_at = self._fetched_at + ttl
+            # Refresh ahead of expiry, but never in the first half of the lifetime
+            self._refresh_at = self._expires_at - min(self.refresh_margin, ttl / 2)
+            return certs
+
+    def _start_background_refresh(self):
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                return
+            future = self._submit()
+        future.add_done_callback(self._log_background_failure)
+
+    @staticmethod
+    def _log_background_failure(future):
+        error = future.exception()
+        if error is not None:
+            print(f"Background signing key refresh failed: {error}")
+
+    def _fetch(self):
+        import requests
+
+        if self.session is None:
+            # Only ever used from the fetch thread
+            self.session = requests.Session()
+        self.fetches += 1
+        response = self.session.get(self.certs_url, timeout=self.timeout)
+        response.raise_for_status()
+        certs = response.json()
+        if not isinstance(certs, dict) or not certs:
+            raise ValueError('Signing key response is not a non-empty JSON object')
+        return certs, self._ttl_from_headers(response.headers)
+
+    def _ttl_from_headers(self, headers):
+        """Seconds the response may be cached, from Cache-Control max-age minus Age"""
+        cache_control = headers.get('Cache-Control', '')
+        if 'no-store' in cache_control or 'no-cache' in cache_control:
+            return 0
+        match = _MAX_AGE_RE.search(cache_control)
+        if not match:
+            return self.default_ttl
+        try:
+            age = int(headers.get('Age', 0))
+        except ValueError:
+            age = 0
+        return max(0, int(match.group(1)) - age)
@@ -0,0 +1,206 @@
+import csv
+import json
+import click
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from src.models.book import Book
+from src.models.user import db
+from src.services.search_service import search_service
+from src.services.suggest_index import suggest_index
+from src.services.stats_service import stats_service
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+DUPLICATE_MODES = ('skip', 'upsert')
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+BOOK_FIELDS = ('title', 'author', 'isbn', 'genre', 'publication_year', 'description')
+
+
+class ImportReport:
+    """Running totals and per-row errors for one import"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row_number, message, isbn=None):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'isbn': isbn, 'error': message})
+
+    def to_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+class ImportService:
+    """Bulk catalog import from CSV or NDJSON.
+
+    Rows are validated with ``Book.validate_data`` (the same rules as
+    ``create_book``) and written in batches: one executemany INSERT and one
+    executemany UPDATE per batch, each batch in its own transaction. Rows
+    whose ISBN already exists are skipped or updated in place depending on
+    ``on_duplicate``.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+        @app.cli.command('import-books')
+        @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+        @click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None,
+                      help='Input format (default: from the file extension).')
+        @click.option('--on-duplicate', type=click.Choice(DUPLICATE_MODES), default='skip',
+                      help='What to do with rows whose ISBN already exists.')
+        @click.option('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, show_default=True)
+        def import_books(path, fmt, on_duplicate, batch_size):
+            """Import books from a CSV or NDJSON file."""
+            fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+            with open(path, newline='', encoding='utf-8') as f:
+                report = self.import_books(f, fmt, on_duplicate=on_duplicate, batch_size=batch_size)
+            print(json.dumps(report, indent=2))
+
+    def import_books(self, stream, fmt, on_duplicate='skip', batch_size=DEFAULT_BATCH_SIZE):
+        """Import books from a text stream; returns the report as a dict (requires app context)"""
+        if fmt not in IMPORT_FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        if on_duplicate not in DUPLICATE_MODES:
+            raise ValueError(f"Unsupported on_duplicate mode: {on_duplicate}")
+
+        report = ImportReport()
+        records = self._parse_csv(stream) if fmt == 'csv' else self._parse_ndjson(stream)
+        batch = []
+        for row_number, data, error in records:
+            if error:
+                report.error(row_number, error)
+                continue
+
+            values, error = Book.validate_data(data)
+            if error:
+                report.error(row_number, error, isbn=(data.get('isbn') or None) if isinstance(data, dict) else None)
+                continue
+
+            batch.append((row_number, values))
+            if len(batch) >= batch_size:
+                self._write_batch(batch, on_duplicate, report)
+                batch = []
+
+        if batch:
+            self._write_batch(batch, on_duplicate, report)
+        return report.to_dict()
+
+    def _write_batch(self, batch, on_duplicate, report):
+        # Resolve duplicate ISBNs against the table and within the batch
+        isbns = {values['isbn'] for _, values in batch if values['isbn']}
+        existing = {}
+        if isbns:
+            existing = dict(db.session.execute(
+                select(Book.isbn, Book.id).where(Book.isbn.in_(isbns))
+            ).all())
+
+        inserts = []
+        updates = {}
+        pending = {}  # ISBN -> its row in inserts
+        skipped = 0
+        merged = 0
+        for row_number, values in batch:
+            isbn = values['isbn']
+            if isbn and isbn in existing:
+                if on_duplicate == 'skip':
+                    skipped += 1
+                    continue
+                book_id = existing[isbn]
+                if book_id in updates:
+                    merged += 1
+                # Last occurrence in the batch wins
+                updates[book_id] = dict(values, id=book_id)
+            elif isbn and isbn in pending:
+                if on_duplicate == 'skip':
+                    skipped += 1
+                else:
+                    pending[isbn].update(values)
+                    merged += 1
+            else:
+                row = dict(values)
+                if isbn:
+                    pending[isbn] = row
+                inserts.append(row)
+
+        try:
+            connection = db.session.connection()
+            if inserts:
+                ids = db.session.execute(
+                    insert(Book).returning(Book.id, sort_by_parameter_order=True), inserts
+                ).scalars().all()
+                for row, book_id in zip(inserts, ids):
+                    row['id'] = book_id
+                # Bulk statements skip the ORM flush hooks, so update derived data here
+                search_service.index_rows(connection, inserts, replace=False)
+                stats_service.adjust(connection, total=len(inserts))
+
+            if updates:
+                rows = list(updates.values())
+                db.session.execute(update(Book), rows)
+                search_service.index_rows(connection, rows)
+                if not inserts:
+                    stats_service.adjust(connection)
+
+            db.session.commit()
+            suggest_index.put_rows(inserts + list(updates.values()))
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            if len(batch) > 1:
+                # Retry row by row so one bad row does not fail its whole batch
+                for item in batch:
+                    self._write_batch([item], on_duplicate, report)
+                return
+            row_number, values = batch[0]
+            report.error(row_number, f"Database error: {getattr(e, 'orig', None) or e}", isbn=values['isbn'])
+            return
+
+        report.created += len(inserts)
+        # Rows merged into an earlier row of the batch updated that book
+        report.updated += len(updates) + merged
+        report.skipped += skipped
+
+    @staticmethod
+    def _parse_csv(stream):
+        reader = csv.DictReader(stream)
+        if reader.fieldnames is None:
+            return
+        missing = [field for field in ('title', 'author') if field not in reader.fieldnames]
+        if missing:
+            yield 1, None, f"CSV header is missing required columns: {', '.join(missing)}"
+            return
+        for data in reader:
+            # Header is line 1, so data rows are numbered from 2 like in a spreadsheet
+            yield reader.line_num, {field: data.get(field) for field in BOOK_FIELDS}, None
+
+    @staticmethod
+    def _parse_ndjson(stream):
+        for row_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield row_number, json.loads(line), None
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {e}"
+
+
+# Global import service instance
+import_service = ImportService()
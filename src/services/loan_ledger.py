@@ -0,0 +1,194 @@
+import time
+from collections import Counter
+from datetime import date, datetime
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models.book import Book, LoanEvent, LoanRollup
+from src.models.user import db
+
+ROLLUP_PERIODS = ('day', 'month')
+ROLLUP_DIMENSIONS = ('book', 'genre', 'borrower')
+DEFAULT_TOP_LIMIT = 10
+MAX_TOP_LIMIT = 100
+REBUILD_BATCH_SIZE = 5000
+# Ledger pages are ordered by time; ends in the primary key so it is unique
+HISTORY_ORDER = (LoanEvent.occurred_at, LoanEvent.id)
+
+_UPSERT_DIALECTS = {'sqlite': sqlite, 'postgresql': postgresql}
+
+
+def period_start(period, moment):
+    """First day of the day or month containing ``moment``"""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    return day.replace(day=1) if period == 'month' else day
+
+
+def parse_period_start(period, value):
+    """Parse ``YYYY-MM-DD`` (or ``YYYY-MM`` for months) into a period start; None means today.
+
+    Raises ValueError for an unknown period or a malformed date.
+    """
+    if period not in ROLLUP_PERIODS:
+        raise ValueError(f"Invalid period, expected one of: {', '.join(ROLLUP_PERIODS)}")
+    if not value:
+        return period_start(period, datetime.utcnow())
+    try:
+        if period == 'month' and len(value) == 7:
+            value += '-01'
+        return period_start(period, date.fromisoformat(value))
+    except ValueError:
+        raise ValueError('Invalid date, expected YYYY-MM-DD' + (' or YYYY-MM' if period == 'month' else ''))
+
+
+class LoanLedger:
+    """Loan history kept as an append-only event table plus checkout rollups.
+
+    Every checkout and check-in appends a ``loan_events`` row in the
+    caller's transaction. Checkouts also add one to the ``loan_rollups``
+    counters for their day and month, per book, genre and borrower, so
+    "most borrowed" reports read a handful of counter rows instead of
+    scanning events. Genres are counted as they were at checkout time;
+    ``flask loans-rebuild-rollups`` recounts from the ledger using the
+    current genres.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+        @app.cli.command('loans-rebuild-rollups')
+        def loans_rebuild_rollups():
+            """Recount the loan rollups from the loan ledger."""
+            start = time.perf_counter()
+            with db.engine.begin() as connection:
+                events = self.rebuild_rollups(connection)
+            print(f"Rebuilt loan rollups from {events} checkouts in {time.perf_counter() - start:.2f}s")
+
+    def record_checkout(self, connection, book_id, borrower_email, genre, occurred_at, due_date):
+        """Append a checkout and count it in the rollups, inside the caller's transaction"""
+        connection.execute(insert(LoanEvent).values(
+            book_id=book_id, borrower_email=borrower_email, action=LoanEvent.CHECKOUT,
+            occurred_at=occurred_at, due_date=due_date
+        ))
+        self._increment(connection, Counter(self._rollup_keys(book_id, genre, borrower_email, occurred_at)))
+
+    def record_checkin(self, connection, book_id, borrower_email, occurred_at):
+        """Append a check-in, inside the caller's transaction"""
+        connection.execute(insert(LoanEvent).values(
+            book_id=book_id, borrower_email=borrower_email, action=LoanEvent.CHECKIN, occurred_at=occurred_at
+        ))
+
+    def history_query(self, book_id=None, borrower_email=None, since=None, until=None):
+        """Query of ledger events, optionally for one book or borrower and a time range; order by ``HISTORY_ORDER``"""
+        query = db.session.query(LoanEvent)
+        if book_id is not None:
+            query = query.filter(LoanEvent.book_id == book_id)
+        if borrower_email:
+            query = query.filter(LoanEvent.borrower_email == borrower_email)
+        if since:
+            query = query.filter(LoanEvent.occurred_at >= since)
+        if until:
+            query = query.filter(LoanEvent.occurred_at < until)
+        return query
+
+    def top(self, dimension, period='month', start=None, limit=DEFAULT_TOP_LIMIT):
+        """Most borrowed books, genres or borrowers in one day or month (requires app context).
+
+        Raises ValueError for an unknown dimension or period.
+        """
+        if dimension not in ROLLUP_DIMENSIONS:
+            raise ValueError(f"Invalid dimension, expected one of: {', '.join(ROLLUP_DIMENSIONS)}")
+        start = start or parse_period_start(period, None)
+        rows = db.session.execute(
+            select(LoanRollup.key, LoanRollup.loans)
+            .where(LoanRollup.period == period, LoanRollup.dimension == dimension, LoanRollup.period_start == start)
+            .order_by(LoanRollup.loans.desc(), LoanRollup.key)
+            .limit(max(1, min(limit, MAX_TOP_LIMIT)))
+        ).all()
+
+        if dimension != 'book':
+            return [{dimension: row.key or None, 'loans': row.loans} for row in rows]
+
+        # Titles for the page of ids; deleted books keep their counts without one
+        books = {
+            book.id: book for book in db.session.execute(
+                select(Book.id, Book.title, Book.author).where(Book.id.in_([int(row.key) for row in rows]))
+            )
+        }
+        results = []
+        for row in rows:
+            book = books.get(int(row.key))
+            results.append({
+                'book_id': int(row.key),
+                'title': book.title if book else None,
+                'author': book.author if book else None,
+                'loans': row.loans
+            })
+        return results
+
+    def rebuild_rollups(self, connection):
+        """Replace every rollup with counts from the ledger; returns the number of checkouts counted"""
+        connection.execute(delete(LoanRollup))
+        counts = Counter()
+        events = 0
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                select(LoanEvent.id, LoanEvent.book_id, LoanEvent.borrower_email, LoanEvent.occurred_at, Book.genre)
+                .outerjoin(Book, Book.id == LoanEvent.book_id)
+                .where(LoanEvent.action == LoanEvent.CHECKOUT, LoanEvent.id > last_id)
+                .order_by(LoanEvent.id)
+                .limit(REBUILD_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                counts.update(self._rollup_keys(row.book_id, row.genre, row.borrower_email, row.occurred_at))
+            events += len(rows)
+            last_id = rows[-1].id
+        if counts:
+            self._increment(connection, counts)
+        return events
+
+    @staticmethod
+    def _rollup_keys(book_id, genre, borrower_email, occurred_at):
+        keys = {'book': str(book_id), 'genre': genre or '', 'borrower': borrower_email or ''}
+        return [
+            (period, dimension, period_start(period, occurred_at), key)
+            for period in ROLLUP_PERIODS
+            for dimension, key in keys.items()
+        ]
+
+    @staticmethod
+    def _increment(connection, counts):
+        """Add ``counts`` ({(period, dimension, period_start, key): n}) to the rollup rows"""
+        rows = [
+            {'period': period, 'dimension': dimension, 'period_start': start, 'key': key, 'loans': loans}
+            for (period, dimension, start, key), loans in counts.items()
+        ]
+        table = LoanRollup.__table__
+        dialect = _UPSERT_DIALECTS.get(connection.dialect.name)
+        if dialect is not None:
+            statement = dialect.insert(table)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.period, table.c.dimension, table.c.period_start, table.c.key],
+                set_={'loans': table.c.loans + statement.excluded.loans}
+            ), rows)
+            return
+
+        for row in rows:
+            if connection.execute(
+                update(table)
+                .where(table.c.period == row['period'], table.c.dimension == row['dimension'],
+                       table.c.period_start == row['period_start'], table.c.key == row['key'])
+                .values(loans=table.c.loans + row['loans'])
+            ).rowcount == 0:
+                connection.execute(insert(table).values(**row))
+
+
+# Global loan ledger instance
+loan_ledger = LoanLedger()
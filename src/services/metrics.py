@@ -0,0 +1,375 @@
+import atexit
+import json
+import os
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Latency buckets in seconds (the Prometheus client defaults)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BOOT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+ARCHIVE_FILE = 'archive.json'
+DEAD_PREFIX = 'dead-'
+LOCK_FILE = '.lock'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms rendered in the Prometheus text format.
+
+    Each process keeps its own samples in memory. When ``directory`` is set
+    (gunicorn.conf.py points every worker at the same one), each worker
+    writes a JSON snapshot there every ``flush_interval`` seconds and on
+    exit, and a scrape served by any worker adds up all snapshots, so the
+    numbers cover the whole server rather than whichever worker answered.
+    Snapshots of exited workers (see ``mark_process_dead``) are folded into
+    ``archive.json`` so counters never go backwards; their gauges are
+    dropped.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.flush_interval = 5
+        self._meta = {}
+        self._values = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    # Registration
+
+    def counter(self, name, help):
+        self._meta[name] = ('counter', help, None)
+
+    def gauge(self, name, help, mode='sum'):
+        """``mode`` says how to combine workers: 'sum' (e.g. in-flight requests) or 'max' (settings)"""
+        self._meta[name] = ('gauge', help, mode)
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        self._meta[name] = ('histogram', help, tuple(buckets))
+
+    # Recording
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        buckets = self._meta[name][2]
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    # Snapshots
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[name, list(labels), value] for (name, labels), value in self._values.items()]
+            return {
+                'counters': [sample for sample in samples if self._meta[sample[0]][0] == 'counter'],
+                'gauges': [sample for sample in samples if self._meta[sample[0]][0] == 'gauge'],
+                'histograms': [
+                    [name, list(labels), list(counts), total, count]
+                    for (name, labels), (counts, total, count) in self._histograms.items()
+                ]
+            }
+
+    def flush(self):
+        """Write this process's snapshot to the shared directory"""
+        if self.directory:
+            _write_json(os.path.join(self.directory, f'{os.getpid()}.json'), self.snapshot())
+
+    def ensure_flusher(self):
+        """Start the periodic snapshot writer in this process (once per fork)"""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        thread = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+        thread.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Metrics snapshot failed: {e}")
+
+    def _collect(self):
+        """Combine this process's samples with every other worker's snapshot"""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            import fcntl
+
+            # Scrapes in different workers take turns so none of them reads
+            # a dead worker's samples both before and after compaction
+            with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                filenames = [name for name in os.listdir(self.directory) if name.endswith('.json')]
+                dead_files = [name for name in filenames if name.startswith(DEAD_PREFIX)]
+                if dead_files:
+                    _compact(self.directory, dead_files)
+                own = f'{os.getpid()}.json'
+                for filename in os.listdir(self.directory):
+                    if filename.endswith('.json') and filename != own:
+                        data = _read_json(os.path.join(self.directory, filename))
+                        if data:
+                            snapshots.append(data)
+        return _merge(snapshots, self._meta)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        values, histograms = self._collect()
+        lines = []
+        for name, (kind, help, option) in sorted(self._meta.items()):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'histogram':
+                for labels, (counts, total, count) in sorted(histograms.get(name, {}).items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(option, counts):
+                        cumulative += bucket_count
+                        lines.append(f'{name}_bucket{_format_labels(labels, le=_format_value(bound))} {cumulative}')
+                    lines.append(f'{name}_bucket{_format_labels(labels, le="+Inf")} {count}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {count}')
+            else:
+                for labels, value in sorted(values.get(name, {}).items()):
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    """Request, SQL and auth instrumentation for the Flask app"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.registry = MetricsRegistry()
+        self._register()
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Install request hooks and SQL listeners; call after ``db.init_app``"""
+        from src.models.user import db
+
+        self.app = app
+        self.registry.directory = app.config.get('METRICS_DIR')
+        self.registry.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+        if self.registry.directory:
+            os.makedirs(self.registry.directory, exist_ok=True)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _register(self):
+        registry = self.registry
+        registry.counter('http_requests_total', 'HTTP requests by endpoint, method and status')
+        registry.histogram('http_request_duration_seconds', 'HTTP request latency by endpoint, including streamed bodies')
+        registry.gauge('http_requests_in_progress', 'HTTP requests currently being served')
+        registry.counter('db_statements_total', 'SQL statements executed')
+        registry.counter('db_statement_seconds_total', 'Time spent executing SQL statements')
+        registry.histogram('db_statements_per_request', 'SQL statements executed per request', buckets=QUERY_COUNT_BUCKETS)
+        registry.histogram('db_seconds_per_request', 'Time spent in SQL per request')
+        registry.counter('auth_cache_lookups_total', 'Principal cache lookups by result')
+        registry.histogram('auth_token_verification_seconds', 'Token verification latency by token kind and outcome')
+        registry.counter('response_cache_lookups_total', 'Response cache lookups by result')
+        registry.counter('refresh_tokens_pruned_total', 'Expired or revoked refresh tokens deleted')
+        registry.counter('write_behind_rows_total', 'Buffered column values written, by column')
+        registry.histogram('worker_boot_seconds', 'Time from fork to a worker ready to serve', buckets=BOOT_BUCKETS)
+        registry.gauge('suggest_index_entries', 'Keys in the in-memory suggestion index', mode='max')
+        registry.gauge('suggest_index_bytes', 'Approximate memory held by suggestion indexes, all workers')
+
+    # Request hooks
+
+    def _before_request(self):
+        self.registry.ensure_flusher()
+        g._metrics_start = time.perf_counter()
+        g._metrics_endpoint = request.endpoint or 'unmatched'
+        g._metrics_status = 500
+        g._sql_statements = 0
+        g._sql_seconds = 0.0
+        self.registry.inc('http_requests_in_progress', endpoint=g._metrics_endpoint)
+
+    def _after_request(self, response):
+        g._metrics_status = response.status_code
+        return response
+
+    def _teardown_request(self, exc=None):
+        # Runs after a streamed body has been fully sent, so its queries count too
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        endpoint = g._metrics_endpoint
+        method = request.method
+        registry = self.registry
+        registry.inc('http_requests_in_progress', -1, endpoint=endpoint)
+        registry.inc('http_requests_total', endpoint=endpoint, method=method, status=str(g._metrics_status))
+        registry.observe('http_request_duration_seconds', time.perf_counter() - start, endpoint=endpoint, method=method)
+        registry.observe('db_statements_per_request', g._sql_statements, endpoint=endpoint)
+        registry.observe('db_seconds_per_request', g._sql_seconds, endpoint=endpoint)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_metrics_query_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        self.registry.inc('db_statements_total')
+        self.registry.inc('db_statement_seconds_total', elapsed)
+        if has_request_context() and '_sql_statements' in g:
+            g._sql_statements += 1
+            g._sql_seconds += elapsed
+
+    # Service instrumentation
+
+    def auth_cache_lookup(self, hit):
+        self.registry.inc('auth_cache_lookups_total', result='hit' if hit else 'miss')
+
+    def response_cache_lookup(self, hit):
+        self.registry.inc('response_cache_lookups_total', result='hit' if hit else 'miss')
+
+    def token_verified(self, kind, seconds, outcome):
+        self.registry.observe('auth_token_verification_seconds', seconds, kind=kind, outcome=outcome)
+
+    def tokens_pruned(self, count):
+        self.registry.inc('refresh_tokens_pruned_total', count)
+
+    def write_behind_flushed(self, column, count):
+        self.registry.inc('write_behind_rows_total', count, column=column)
+
+    def worker_booted(self, seconds):
+        self.registry.observe('worker_boot_seconds', seconds)
+        # Workers without traffic would otherwise never write their snapshot
+        self.registry.ensure_flusher()
+
+    def suggest_index_loaded(self, entries, size):
+        self.registry.set('suggest_index_entries', entries)
+        self.registry.set('suggest_index_bytes', size)
+
+    def render(self):
+        return self.registry.render()
+
+
+def mark_process_dead(directory, pid):
+    """Mark an exited worker's snapshot as final.
+
+    Called from gunicorn's ``child_exit`` hook, which runs in the master's
+    SIGCHLD handler and may be re-entered, so it only renames the file;
+    the next scrape folds it into the archive.
+    """
+    try:
+        os.rename(os.path.join(directory, f'{pid}.json'), os.path.join(directory, f'{DEAD_PREFIX}{pid}.json'))
+    except FileNotFoundError:
+        pass
+
+
+def _compact(directory, dead_files):
+    """Fold exited workers' counters and histograms into the archive; their gauges are dropped"""
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    snapshots = [_read_json(archive_path) or {}]
+    for filename in dead_files:
+        data = _read_json(os.path.join(directory, filename)) or {}
+        data.pop('gauges', None)
+        snapshots.append(data)
+    values, histograms = _merge(snapshots)
+    _write_json(archive_path, {
+        'counters': [[name, list(labels), value] for name, samples in values.items() for labels, value in samples.items()],
+        'histograms': [
+            [name, list(labels), counts, total, count]
+            for name, samples in histograms.items() for labels, (counts, total, count) in samples.items()
+        ]
+    })
+    for filename in dead_files:
+        os.remove(os.path.join(directory, filename))
+
+
+def _merge(snapshots, meta={}):
+    values = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for kind in ('counters', 'gauges'):
+            for name, labels, value in snapshot.get(kind, ()):
+                samples = values.setdefault(name, {})
+                labels = tuple(tuple(pair) for pair in labels)
+                if kind == 'gauges' and meta.get(name, (None, None, None))[2] == 'max':
+                    samples[labels] = max(samples.get(labels, value), value)
+                else:
+                    samples[labels] = samples.get(labels, 0) + value
+        for name, labels, counts, total, count in snapshot.get('histograms', ()):
+            samples = histograms.setdefault(name, {})
+            labels = tuple(tuple(pair) for pair in labels)
+            entry = samples.get(labels)
+            if entry is None:
+                samples[labels] = (list(counts), total, count)
+            else:
+                samples[labels] = ([a + b for a, b in zip(entry[0], counts)], entry[1] + total, entry[2] + count)
+    return values, histograms
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's execution context, so a statement that fails leaves nothing behind
+    if context is not None:
+        context._metrics_query_start = time.perf_counter()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    # Write then rename so readers never see a partial snapshot
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+# Global metrics instance
+metrics = Metrics()
@@ -0,0 +1,154 @@
+import importlib
+import pkgutil
+import sys
+from datetime import datetime
+from flask.cli import AppGroup
+from sqlalchemy import inspect, text
+from src.models.user import db
+
+MIGRATIONS_PACKAGE = 'src.migrations'
+VERSION_TABLE = 'schema_migrations'
+
+
+class Migration:
+    """One revision module from ``src/migrations``.
+
+    Modules are named ``<revision>_<slug>.py`` and define ``upgrade(connection)``
+    plus a one-line docstring. ``db.create_all()`` only adds indexes to the
+    tables it creates, so an index added to a model for an existing table
+    also needs a revision. Revisions must be safe to run against a fresh
+    database whose tables already carry every index, so use the helpers
+    below that skip objects that exist.
+    """
+
+    def __init__(self, revision, name, module):
+        self.revision = revision
+        self.name = name
+        self.module = module
+        self.description = (module.__doc__ or name).strip().splitlines()[0]
+
+    def upgrade(self, connection):
+        self.module.upgrade(connection)
+
+
+class MigrationService:
+    """Versioned schema changes applied with ``flask db upgrade``.
+
+    Tables that do not exist yet are created from the models first, so a
+    fresh database only records the revisions. Applied revisions are
+    recorded in the ``schema_migrations`` table; each pending revision
+    runs in its own transaction, in order.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        group = AppGroup('db', help='Schema migrations.')
+
+        @group.command('upgrade')
+        def upgrade_command():
+            """Create missing tables and apply all pending migrations."""
+            applied = self.upgrade()
+            for migration in applied:
+                print(f"Applied {migration.revision}: {migration.description}")
+            if not applied:
+                print('Database is up to date')
+
+        @group.command('current')
+        def current_command():
+            """Show applied and pending migrations."""
+            applied = self.applied_revisions()
+            for migration in self.migrations():
+                state = 'applied' if migration.revision in applied else 'pending'
+                print(f"{migration.revision} [{state}] {migration.description}")
+
+        @group.command('check-plans')
+        def check_plans_command():
+            """Verify that the hot queries are planned with the expected indexes."""
+            from src.migrations.query_plans import check_query_plans
+
+            failures = 0
+            for name, index, ok, plan in check_query_plans(db.session.connection()):
+                status = 'ok' if ok else ('skipped' if ok is None else 'MISSING INDEX')
+                print(f"{status:>13}  {name} (expects {index})")
+                if ok is False:
+                    failures += 1
+                    print(f"               plan: {plan}")
+            if failures:
+                sys.exit(1)
+
+        app.cli.add_command(group)
+
+    def migrations(self):
+        """All revisions, oldest first"""
+        package = importlib.import_module(MIGRATIONS_PACKAGE)
+        found = []
+        for module_info in pkgutil.iter_modules(package.__path__):
+            revision, _, name = module_info.name.partition('_')
+            if not revision.isdigit():
+                continue
+            module = importlib.import_module(f'{MIGRATIONS_PACKAGE}.{module_info.name}')
+            found.append(Migration(revision, name, module))
+        return sorted(found, key=lambda migration: migration.revision)
+
+    def applied_revisions(self):
+        """Revisions recorded in the version table (requires app context)"""
+        connection = db.session.connection()
+        self._ensure_version_table(connection)
+        revisions = {row[0] for row in connection.execute(text(f'SELECT revision FROM {VERSION_TABLE}'))}
+        db.session.commit()
+        return revisions
+
+    def pending(self):
+        applied = self.applied_revisions()
+        return [migration for migration in self.migrations() if migration.revision not in applied]
+
+    def upgrade(self):
+        """Create missing tables, then apply pending revisions in order, one transaction each.
+
+        Requires an app context. Run once per release (``flask release``),
+        not from worker startup.
+        """
+        db.create_all()
+        applied = []
+        for migration in self.pending():
+            with db.engine.begin() as connection:
+                migration.upgrade(connection)
+                connection.execute(
+                    text(f'INSERT INTO {VERSION_TABLE} (revision, description, applied_at) '
+                         'VALUES (:revision, :description, :applied_at)'),
+                    {'revision': migration.revision, 'description': migration.description,
+                     'applied_at': datetime.utcnow()}
+                )
+            applied.append(migration)
+        return applied
+
+    @staticmethod
+    def _ensure_version_table(connection):
+        connection.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ('
+            'revision VARCHAR(32) PRIMARY KEY, '
+            'description VARCHAR(255) NOT NULL, '
+            'applied_at TIMESTAMP NOT NULL)'
+        ))
+
+
+def create_index(connection, name, table, columns, unique=False):
+    """CREATE INDEX unless an index with this name already exists on the table"""
+    existing = {index['name'] for index in inspect(connection).get_indexes(table)}
+    if name in existing:
+        return False
+    preparer = connection.dialect.identifier_preparer
+    connection.execute(text(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {preparer.quote(name)} ON {preparer.quote(table)} "
+        f"({', '.join(preparer.quote(column) for column in columns)})"
+    ))
+    return True
+
+
+# Global migration service instance
+migration_service = MigrationService()
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+from src.models.user import User, UserRole, db, permission_engine
+
+
+class AuthenticatedUser:
+    """The fields of a User that authentication and authorization need.
+
+    Stored in the principal cache instead of the ORM object so a request can
+    be authorized without a database round trip. The full User row is only
+    loaded if a route asks for it (``user`` / ``to_dict()``). ``permissions``
+    is the role's permission bitmask.
+    """
+
+    __slots__ = ('id', 'email', 'role', 'is_active', 'permissions', '_user')
+
+    def __init__(self, id, email, role, is_active, permissions=None):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.is_active = is_active
+        self.permissions = permission_engine.mask(role) if permissions is None else permissions
+        self._user = None
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.email, user.role, user.is_active)
+
+    @classmethod
+    def from_claims(cls, payload):
+        """Principal from access-token claims alone, or None if they are incomplete.
+
+        The role is the one the token was issued with: a role change,
+        deactivation or deletion only shows once the token is refreshed.
+        """
+        try:
+            role = UserRole(payload['role'])
+        except (KeyError, ValueError):
+            return None
+        permissions = permission_engine.from_claim(payload.get('perms'), role)
+        if permissions is None or 'user_id' not in payload:
+            return None
+        return cls(payload['user_id'], payload.get('email'), role, True, permissions)
+
+    def __repr__(self):
+        return f'<AuthenticatedUser {self.email}>'
+
+    def has_permission(self, permission):
+        return permission_engine.allows(self.permissions, permission)
+
+    def permission_names(self):
+        return permission_engine.names(self.permissions)
+
+    @property
+    def user(self):
+        """The full User row, loaded on first access; None if it was deleted since the token was issued"""
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+    def to_dict(self):
+        """The User row as a dict, or None if it was deleted"""
+        user = self.user
+        return user.to_dict() if user is not None else None
+
+    def copy(self):
+        return AuthenticatedUser(self.id, self.email, self.role, self.is_active, self.permissions)
+
+
+class PrincipalCache:
+    """Bounded, TTL-based LRU cache of AuthenticatedUser entries keyed by user id.
+
+    Entries are dropped explicitly when a user's role, status or tokens
+    change. Other gunicorn workers keep their copy until the TTL expires,
+    so ``ttl`` bounds how long a change can take to apply everywhere.
+    """
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                principal, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    # Hand out a copy so the lazily loaded User stays request-local
+                    return principal.copy()
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, principal):
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[principal.id] = (principal.copy(), time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl
+            }
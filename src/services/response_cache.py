@@ -0,0 +1,242 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, unquote
+from src.utils.http_cache import normalized_query_string
+from src.services.metrics import metrics
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache bounded by entry count and total body size"""
+
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self.size_bytes += len(value)
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.size_bytes, 'evictions': self.evictions}
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self.size_bytes -= len(value)
+
+
+class RedisError(Exception):
+    """Error reply or protocol failure from a Redis-protocol server"""
+
+
+class RedisCacheBackend:
+    """Cache stored in a Redis-protocol server (Redis, Valkey, KeyDB, or a test stand-in).
+
+    Speaks just enough RESP for GET and SET ... EX over one socket per
+    thread. Eviction is left to the server's ``maxmemory-policy`` (use an
+    LRU policy). Connection errors are treated as cache misses so an
+    unavailable cache server never fails a request.
+    """
+
+    def __init__(self, url, key_prefix='library:', timeout=0.25):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+        self.errors = 0
+        self._local = threading.local()
+
+    def get(self, key):
+        try:
+            return self._command(b'GET', self.key_prefix + key)
+        except (OSError, RedisError) as e:
+            self._fail(e)
+            return None
+
+    def set(self, key, value, ttl):
+        try:
+            self._command(b'SET', self.key_prefix + key, value, b'EX', str(max(1, int(ttl))))
+        except (OSError, RedisError) as e:
+            self._fail(e)
+
+    def clear(self):
+        # Keys embed the catalog version, so old entries are never read again
+        # and expire on their own; nothing to do here.
+        pass
+
+    def stats(self):
+        return {'server': f'{self.host}:{self.port}/{self.db}', 'errors': self.errors}
+
+    def _fail(self, error):
+        self.errors += 1
+        self._disconnect()
+        print(f"Response cache server error: {error}")
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        if self.password:
+            self._command(b'AUTH', self.password)
+        if self.db:
+            self._command(b'SELECT', str(self.db))
+
+    def _disconnect(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+        self._local.reader = None
+
+    def _command(self, *args):
+        if getattr(self._local, 'sock', None) is None:
+            self._connect()
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        self._local.sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise RedisError('Connection closed by server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload
+        if kind == b'-':
+            raise RedisError(payload.decode(errors='replace'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise RedisError(f'Unexpected reply: {line!r}')
+
+
+class ResponseCache:
+    """Cache of serialized JSON bodies for public catalog reads.
+
+    Keys combine the endpoint, the catalog version and the normalized query
+    string, so any book write (which bumps the version) makes every older
+    entry unreachable in all workers at once. Write paths also call
+    ``invalidate()`` to free this worker's memory straight away. Bodies are
+    stored without per-user fields; authenticated callers get them merged
+    in on the way out.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.backend = MemoryCacheBackend()
+        self.ttl = 300
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', 300)
+        self.enabled = self.ttl > 0
+        url = app.config.get('RESPONSE_CACHE_URL')
+        if url:
+            self.backend = RedisCacheBackend(url)
+        else:
+            self.backend = MemoryCacheBackend(
+                max_entries=app.config.get('RESPONSE_CACHE_SIZE', 1000),
+                max_bytes=app.config.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+            )
+
+    def key(self, name, version, variant=None):
+        """Cache key for the current request's query string; ``variant`` separates negotiated formats"""
+        return f'{name}:{version}:{variant or ""}:{normalized_query_string()}'
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        body = self.backend.get(key)
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        metrics.response_cache_lookup(body is not None)
+        return body
+
+    def set(self, key, body):
+        if self.enabled:
+            self.backend.set(key, body, self.ttl)
+
+    def invalidate(self):
+        """Drop this worker's cached bodies after a book write"""
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(
+            self.backend.stats(),
+            backend=type(self.backend).__name__,
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=round(self.hits / lookups, 4) if lookups else 0.0
+        )
+
+
+def merge_json_object(body, extra):
+    """Append already-encoded ``extra`` members to a cached JSON object body"""
+    if not extra:
+        return body
+    body = body.rstrip()
+    separator = b'' if body == b'{}' else b','
+    return body[:-1] + separator + extra[1:-1] + b'}'
+
+
+# Global response cache instance
+response_cache = ResponseCache()
@@ -0,0 +1,313 @@
+import re
+import unicodedata
+from sqlalchemy import event, text, select, insert, delete, func, literal, case, union_all, false
+from sqlalchemy.exc import OperationalError
+from src.models.book import Book, BookSearchTerm
+from src.models.user import db
+
+# Indexed columns and their relevance weights (higher ranks first)
+SEARCH_FIELDS = ('title', 'author', 'genre', 'description', 'isbn')
+FIELD_WEIGHTS = {
+    'title': 10.0,
+    'author': 6.0,
+    'genre': 3.0,
+    'description': 1.0,
+    'isbn': 8.0
+}
+
+MAX_TERM_LENGTH = 64
+REINDEX_BATCH_SIZE = 500
+
+# Facet values returned for genre and author (most frequent first)
+DEFAULT_FACET_LIMIT = 20
+MAX_FACET_LIMIT = 100
+# publication_year is counted in buckets of this many years (decades)
+DEFAULT_YEAR_BUCKET = 10
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(value):
+    """Split text into lowercase, accent-free search terms"""
+    if not value:
+        return []
+    normalized = str(value)
+    if not normalized.isascii():
+        # ASCII text has no accents to strip, so only the rest pays for this
+        normalized = unicodedata.normalize('NFKD', normalized)
+        normalized = ''.join(c for c in normalized if not unicodedata.combining(c))
+    normalized = normalized.lower()
+    return [token[:MAX_TERM_LENGTH] for token in _TOKEN_RE.findall(normalized)]
+
+
+def _compact_isbn(isbn):
+    """ISBN without separators, so '9780743' matches '978-0-7432-7356-5'"""
+    return re.sub(r'[^0-9xX]', '', isbn or '').lower()
+
+
+class SearchService:
+    """Relevance-ranked book search.
+
+    Uses an FTS5 virtual table on SQLite and a portable inverted index
+    (``book_search_terms``) on every other backend. Both are kept in sync
+    with the ``book`` table from ORM flush events, inside the same
+    transaction as the book write.
+    """
+
+    FTS_TABLE = 'books_fts'
+
+    def __init__(self, app=None):
+        self.app = app
+        self.backend = None
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+        @app.cli.command('search-reindex')
+        def search_reindex():
+            """Rebuild the book search index from scratch."""
+            count = self.rebuild()
+            print(f"Indexed {count} books using {self.backend}")
+
+    def ensure_index(self):
+        """Create the search index if needed and backfill it (requires app context)"""
+        connection = db.session.connection()
+        backend = self._backend_for(connection)
+
+        if backend == 'fts5':
+            indexed = connection.execute(text(f'SELECT count(*) FROM {self.FTS_TABLE}')).scalar()
+        else:
+            indexed = connection.execute(select(func.count()).select_from(BookSearchTerm)).scalar()
+
+        if not indexed and Book.query.count():
+            self.rebuild()
+        else:
+            db.session.commit()
+
+    def rebuild(self):
+        """Drop and repopulate every index entry (requires app context)"""
+        connection = db.session.connection()
+        backend = self._backend_for(connection)
+
+        if backend == 'fts5':
+            connection.execute(text(f'DELETE FROM {self.FTS_TABLE}'))
+        else:
+            connection.execute(delete(BookSearchTerm))
+
+        columns = [Book.id] + [getattr(Book, field) for field in SEARCH_FIELDS]
+        count = 0
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                select(*columns).where(Book.id > last_id).order_by(Book.id).limit(REINDEX_BATCH_SIZE)
+            ).mappings().all()
+            if not rows:
+                break
+            self.index_rows(connection, rows, replace=False)
+            count += len(rows)
+            last_id = rows[-1]['id']
+
+        db.session.commit()
+        return count
+
+    def index_rows(self, connection, rows, replace=True):
+        """Index book rows given as mappings with ``id`` and the search fields"""
+        if not rows:
+            return
+        if replace:
+            self.remove_ids(connection, [row['id'] for row in rows])
+
+        if self._backend_for(connection) == 'fts5':
+            documents = []
+            for row in rows:
+                document = {'rowid': row['id']}
+                for field in SEARCH_FIELDS:
+                    document[field] = row[field] or ''
+                if row['isbn']:
+                    document['isbn'] = f"{row['isbn']} {_compact_isbn(row['isbn'])}"
+                documents.append(document)
+            connection.execute(
+                text(f'INSERT INTO {self.FTS_TABLE} (rowid, {", ".join(SEARCH_FIELDS)}) '
+                     f'VALUES (:rowid, {", ".join(":" + field for field in SEARCH_FIELDS)})'),
+                documents
+            )
+        else:
+            terms = []
+            for row in rows:
+                for field in SEARCH_FIELDS:
+                    tokens = set(tokenize(row[field]))
+                    if field == 'isbn' and row[field]:
+                        tokens.add(_compact_isbn(row[field])[:MAX_TERM_LENGTH])
+                    terms.extend({'term': token, 'field': field, 'book_id': row['id']} for token in tokens if token)
+            if terms:
+                connection.execute(insert(BookSearchTerm), terms)
+
+    def remove_ids(self, connection, book_ids):
+        """Remove books from the index"""
+        if not book_ids:
+            return
+        if self._backend_for(connection) == 'fts5':
+            connection.execute(
+                text(f'DELETE FROM {self.FTS_TABLE} WHERE rowid = :id'),
+                [{'id': book_id} for book_id in book_ids]
+            )
+        else:
+            connection.execute(delete(BookSearchTerm).where(BookSearchTerm.book_id.in_(book_ids)))
+
+    def filter_query(self, query, search=None, ranked=True, **fields):
+        """Restrict a Book query to search matches, ordered by relevance.
+
+        ``search`` matches any indexed field; keyword arguments (``title``,
+        ``author``, ...) match a single field. Blank criteria are ignored.
+        Pass ``ranked=False`` to leave the ordering to the caller.
+        """
+        criteria = [(None, search)] + [(field, fields[field]) for field in SEARCH_FIELDS if field in fields]
+        criteria = [(field, value) for field, value in criteria if value and value.strip()]
+        if not criteria:
+            return query
+
+        matches = self.matches(criteria)
+        if matches is None:
+            return query.filter(false())
+
+        query = query.join(matches, Book.id == matches.c.book_id)
+        if ranked:
+            query = query.order_by(matches.c.rank, Book.id)
+        return query
+
+    def matches(self, criteria):
+        """Subquery of (book_id, rank) for every book matching all criteria; lower rank is better"""
+        clauses = [(field, tokenize(value)) for field, value in criteria]
+        if any(not tokens for _, tokens in clauses):
+            return None
+
+        if self._backend_for(db.session.connection()) == 'fts5':
+            return self._fts_matches(clauses)
+        return self._term_matches(clauses)
+
+    def _fts_matches(self, clauses):
+        expressions = []
+        for field, tokens in clauses:
+            expression = ' AND '.join(f'"{token}"*' for token in tokens)
+            expressions.append(f'{field} : ({expression})' if field else f'({expression})')
+
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in SEARCH_FIELDS)
+        return text(
+            f'SELECT rowid AS book_id, bm25({self.FTS_TABLE}, {weights}) AS rank '
+            f'FROM {self.FTS_TABLE} WHERE {self.FTS_TABLE} MATCH :expression'
+        ).bindparams(expression=' AND '.join(expressions)).columns(
+            book_id=db.Integer, rank=db.Float
+        ).subquery('search_matches')
+
+    def _term_matches(self, clauses):
+        weight = case(FIELD_WEIGHTS, value=BookSearchTerm.field, else_=1.0)
+        parts = []
+        for field, tokens in clauses:
+            for token in tokens:
+                # Prefix match as a range scan so any B-tree index on term can serve it
+                upper = token[:-1] + chr(ord(token[-1]) + 1)
+                conditions = [BookSearchTerm.term >= token, BookSearchTerm.term < upper]
+                if field:
+                    conditions.append(BookSearchTerm.field == field)
+                parts.append(
+                    select(BookSearchTerm.book_id, literal(len(parts)).label('clause'), weight.label('weight'))
+                    .where(*conditions)
+                )
+
+        hits = union_all(*parts).subquery('search_hits')
+        return (
+            select(hits.c.book_id, (-func.sum(hits.c.weight)).label('rank'))
+            .group_by(hits.c.book_id)
+            .having(func.count(func.distinct(hits.c.clause)) == len(parts))
+            .subquery('search_matches')
+        )
+
+    def facet_counts(self, query, limit=DEFAULT_FACET_LIMIT, year_bucket=DEFAULT_YEAR_BUCKET):
+        """Genre, author, publication-year and availability counts for the books a query matches.
+
+        ``query`` is any Book query, e.g. from ``filter_query``. Its filters
+        are kept and each facet gets its own GROUP BY, so a grouped query
+        returns one row per value of that facet only. Genres and authors
+        are ranked and cut to ``limit`` in SQL.
+        """
+        query = query.order_by(None)
+
+        def top(column):
+            matches = func.count()
+            rows = (
+                query.with_entities(column, matches)
+                .group_by(column)
+                .order_by(matches.desc(), column.is_(None), column)
+                .limit(limit)
+                .all()
+            )
+            return [{'value': value, 'count': count} for value, count in rows]
+
+        bucket = (Book.publication_year // year_bucket) * year_bucket
+        years = dict(query.with_entities(bucket, func.count()).group_by(bucket).all())
+        availability = {'available': 0, 'checked_out': 0}
+        for checked_out, count in query.with_entities(Book.is_checked_out, func.count()).group_by(Book.is_checked_out):
+            availability['checked_out' if checked_out else 'available'] += count
+
+        return {
+            'total': sum(availability.values()),
+            'genre': top(Book.genre),
+            'author': top(Book.author),
+            'publication_year': [
+                {
+                    'from': start,
+                    'to': start + year_bucket - 1 if start is not None else None,
+                    'count': years[start]
+                }
+                # Oldest first, books without a year last
+                for start in sorted(years, key=lambda start: (start is None, start or 0))
+            ],
+            'availability': availability
+        }
+
+    def _backend_for(self, connection):
+        if self.backend is None:
+            self.backend = self._detect_backend(connection)
+        return self.backend
+
+    def _detect_backend(self, connection):
+        if connection.dialect.name != 'sqlite':
+            return 'terms'
+        try:
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.FTS_TABLE} USING fts5("
+                f"{', '.join(SEARCH_FIELDS)}, tokenize='unicode61 remove_diacritics 2')"
+            ))
+            return 'fts5'
+        except OperationalError as e:
+            print(f"FTS5 unavailable, using portable search index: {e}")
+            return 'terms'
+
+    # ORM hooks: keep the index in the same transaction as the book write
+
+    def _after_insert(self, mapper, connection, target):
+        self.index_rows(connection, [self._row(target)], replace=False)
+
+    def _after_update(self, mapper, connection, target):
+        state = db.inspect(target)
+        if any(state.attrs[field].history.has_changes() for field in SEARCH_FIELDS):
+            self.index_rows(connection, [self._row(target)])
+
+    def _after_delete(self, mapper, connection, target):
+        self.remove_ids(connection, [target.id])
+
+    @staticmethod
+    def _row(book):
+        row = {field: getattr(book, field) for field in SEARCH_FIELDS}
+        row['id'] = book.id
+        return row
+
+
+# Global search service instance
+search_service = SearchService()
+
+event.listen(Book, 'after_insert', search_service._after_insert)
+event.listen(Book, 'after_update', search_service._after_update)
+event.listen(Book, 'after_delete', search_service._after_delete)
@@ -0,0 +1,183 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+# Vite writes bundles as assets/[name]-[hash].[ext] with an 8-character hash, e.g.
+# assets/index-CiOm1PI5.js; files copied from public/ keep their names and are revalidated
+FINGERPRINT_RE = re.compile(r'^assets/(?:[^/]+/)*[^/]+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$')
+COMPRESSIBLE_EXTENSIONS = {'.js', '.mjs', '.css', '.html', '.svg', '.json', '.map', '.txt', '.xml', '.ico', '.webmanifest'}
+MIN_COMPRESS_SIZE = 1024
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+# Preferred first; identity is always available
+ENCODINGS = ('br', 'gzip')
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+class Asset:
+    """One static file held in memory with its compressed variants"""
+
+    def __init__(self, path, body, mimetype, immutable):
+        self.path = path
+        self.mimetype = mimetype
+        self.immutable = immutable
+        self.variants = {'identity': body}
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+
+    def add_variant(self, encoding, body):
+        # Only worth sending if it is actually smaller
+        if len(body) < len(self.variants['identity']):
+            self.variants[encoding] = body
+
+    def size(self):
+        return sum(len(body) for body in self.variants.values())
+
+
+class StaticAssets:
+    """Serves the bundled SPA from an in-memory manifest.
+
+    The static folder is scanned once, on the first static request, so
+    booting a worker costs nothing. Each file is read into memory along
+    with its ``.br``/``.gz`` siblings when the build produced them (see
+    ``flask assets-compress``); other compressible files get a gzip
+    variant made while loading. Requests are then answered from the
+    manifest without touching the filesystem: the best encoding the client
+    accepts, ``immutable`` caching for fingerprinted files, and
+    ``index.html`` for every unknown path so client-side routes work.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.folder = None
+        self.assets = {}
+        self.index = None
+        self.loaded = False
+        self._lock = threading.Lock()
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.folder = app.static_folder
+        self.assets = {}
+        self.index = None
+        self.loaded = False
+
+        @app.cli.command('assets-compress')
+        def assets_compress():
+            """Write .gz (and .br, if brotli is installed) next to each compressible static file."""
+            count = self.compress_files()
+            print(f"Compressed {count} files in {self.folder}")
+
+    def load(self):
+        """(Re)build the manifest from the static folder"""
+        assets = {}
+        if self.folder and os.path.isdir(self.folder):
+            for root, _, filenames in os.walk(self.folder):
+                for filename in filenames:
+                    if filename.endswith(tuple(PRECOMPRESSED_SUFFIXES.values())):
+                        continue
+                    full_path = os.path.join(root, filename)
+                    relative_path = os.path.relpath(full_path, self.folder).replace(os.sep, '/')
+                    assets[relative_path] = self._load_asset(full_path, relative_path)
+        self.assets = assets
+        self.index = assets.get('index.html')
+        self.loaded = True
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.load()
+
+    def response(self, path):
+        """Response for a path below the site root, falling back to index.html"""
+        self.ensure_loaded()
+        asset = self.assets.get(path) if path else None
+        if asset is None:
+            asset = self.index
+            if asset is None:
+                return "index.html not found", 404
+
+        encoding = self._negotiate(asset)
+        response = self.app.response_class(mimetype=asset.mimetype)
+        response.set_etag(asset.etag if encoding == 'identity' else f'{asset.etag}-{encoding}')
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if asset.immutable else REVALIDATE_CACHE_CONTROL
+        if len(asset.variants) > 1:
+            response.vary.add('Accept-Encoding')
+
+        if request.if_none_match.contains(response.get_etag()[0]):
+            response.status_code = 304
+            return response
+
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.set_data(asset.variants[encoding])
+        return response
+
+    def stats(self):
+        self.ensure_loaded()
+        return {
+            'files': len(self.assets),
+            'bytes': sum(asset.size() for asset in self.assets.values()),
+            'brotli_available': brotli is not None
+        }
+
+    def compress_files(self):
+        """Build step: write compressed siblings so workers can load instead of compress"""
+        self.ensure_loaded()
+        count = 0
+        for asset in self.assets.values():
+            if not self._compressible(asset.path, asset.variants['identity']):
+                continue
+            full_path = os.path.join(self.folder, asset.path)
+            body = asset.variants['identity']
+            with open(full_path + '.gz', 'wb') as f:
+                f.write(gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(full_path + '.br', 'wb') as f:
+                    f.write(brotli.compress(body, quality=11))
+            count += 1
+        self.load()
+        return count
+
+    def _load_asset(self, full_path, relative_path):
+        with open(full_path, 'rb') as f:
+            body = f.read()
+        mimetype = mimetypes.guess_type(relative_path)[0] or 'application/octet-stream'
+        asset = Asset(relative_path, body, mimetype, immutable=bool(FINGERPRINT_RE.search(relative_path)))
+
+        if self._compressible(relative_path, body):
+            for encoding in ENCODINGS:
+                precompressed = full_path + PRECOMPRESSED_SUFFIXES[encoding]
+                if os.path.exists(precompressed) and os.path.getmtime(precompressed) >= os.path.getmtime(full_path):
+                    with open(precompressed, 'rb') as f:
+                        asset.add_variant(encoding, f.read())
+            if 'gzip' not in asset.variants:
+                asset.add_variant('gzip', gzip.compress(body, compresslevel=6, mtime=0))
+        return asset
+
+    @staticmethod
+    def _compressible(path, body):
+        return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS and len(body) >= MIN_COMPRESS_SIZE
+
+    @staticmethod
+    def _negotiate(asset):
+        accept = request.accept_encodings
+        for encoding in ENCODINGS:
+            if encoding in asset.variants and accept[encoding] > 0:
+                return encoding
+        return 'identity'
+
+
+# Global static asset instance
+static_assets = StaticAssets()
@@ -0,0 +1,144 @@
+import time
+from datetime import datetime
+from sqlalchemy import event, select, insert, update, func
+from src.models.book import Book, LibraryStats
+from src.models.user import db
+
+STATS_ROW_ID = 1
+
+
+def overdue_count_statement(now):
+    """Count of books past due; check-in clears due_date, so the due_date index alone answers this"""
+    return select(func.count()).select_from(Book).where(Book.due_date < now)
+
+
+def checked_out_count_statement():
+    return select(func.count()).select_from(Book).where(Book.is_checked_out == True)
+
+
+class StatsService:
+    """Library statistics served from the precomputed ``library_stats`` row.
+
+    Book inserts, deletes and updates adjust the counters and bump the
+    catalog version from ORM flush events, so the update commits or rolls
+    back together with the book write. Only the overdue count is queried
+    live, as a range scan over the ``due_date`` index.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+        @app.cli.command('stats-reconcile')
+        def stats_reconcile():
+            """Rebuild the library statistics counters from the book table."""
+            stats = self.reconcile()
+            print(f"Reconciled stats: {stats['total_books']} books, {stats['checked_out_books']} checked out")
+
+    def ensure_stats(self):
+        """Create the stats row from scratch if it does not exist yet (requires app context)"""
+        if db.session.get(LibraryStats, STATS_ROW_ID) is None:
+            self.reconcile()
+
+    def reconcile(self):
+        """Recount every counter from the book table (requires app context)"""
+        connection = db.session.connection()
+        values = self._count(connection)
+        if connection.execute(
+            update(LibraryStats)
+            .where(LibraryStats.id == STATS_ROW_ID)
+            .values(catalog_version=LibraryStats.catalog_version + 1, **values)
+        ).rowcount == 0:
+            connection.execute(insert(LibraryStats).values(id=STATS_ROW_ID, **self._new_row(values)))
+        db.session.commit()
+        return values
+
+    def adjust(self, connection, total=0, checked_out=0):
+        """Apply counter deltas and bump the catalog version, inside the caller's transaction"""
+        result = connection.execute(
+            update(LibraryStats)
+            .where(LibraryStats.id == STATS_ROW_ID)
+            .values(
+                total_books=LibraryStats.total_books + total,
+                checked_out_books=LibraryStats.checked_out_books + checked_out,
+                catalog_version=LibraryStats.catalog_version + 1,
+                updated_at=datetime.utcnow()
+            )
+        )
+        if result.rowcount == 0:
+            # No row yet: counting now already includes the change being flushed
+            connection.execute(insert(LibraryStats).values(id=STATS_ROW_ID, **self._new_row(self._count(connection))))
+
+    def catalog_version(self):
+        """Return (version, last_modified) of the catalog as one primary-key read"""
+        row = db.session.execute(
+            select(LibraryStats.catalog_version, LibraryStats.updated_at).where(LibraryStats.id == STATS_ROW_ID)
+        ).first()
+        if row is None:
+            self.reconcile()
+            return self.catalog_version()
+        return row.catalog_version, row.updated_at
+
+    def get_stats(self):
+        """Return the library statistics in O(1) plus one indexed overdue count"""
+        stats = db.session.get(LibraryStats, STATS_ROW_ID)
+        if stats is None:
+            self.reconcile()
+            stats = db.session.get(LibraryStats, STATS_ROW_ID)
+
+        overdue_books = db.session.execute(overdue_count_statement(datetime.utcnow())).scalar()
+
+        return {
+            'total_books': stats.total_books,
+            'available_books': stats.total_books - stats.checked_out_books,
+            'checked_out_books': stats.checked_out_books,
+            'overdue_books': overdue_books
+        }
+
+    @staticmethod
+    def _count(connection):
+        total_books = connection.execute(select(func.count()).select_from(Book)).scalar()
+        checked_out_books = connection.execute(checked_out_count_statement()).scalar()
+        return {
+            'total_books': total_books,
+            'checked_out_books': checked_out_books,
+            'updated_at': datetime.utcnow()
+        }
+
+    @staticmethod
+    def _new_row(values):
+        # Start versions from the clock so a recreated row never reuses old ETags
+        return dict(values, catalog_version=int(time.time()))
+
+    # ORM hooks: adjust the counters in the same transaction as the book write
+
+    def _after_insert(self, mapper, connection, target):
+        self.adjust(connection, total=1, checked_out=1 if target.is_checked_out else 0)
+
+    def _after_delete(self, mapper, connection, target):
+        self.adjust(connection, total=-1, checked_out=-1 if target.is_checked_out else 0)
+
+    def _after_update(self, mapper, connection, target):
+        state = db.inspect(target)
+        if not any(state.attrs[attr.key].history.has_changes() for attr in mapper.column_attrs):
+            return
+
+        checked_out = 0
+        history = state.attrs.is_checked_out.history
+        if history.has_changes():
+            was_checked_out = bool(history.deleted and history.deleted[0])
+            if bool(target.is_checked_out) != was_checked_out:
+                checked_out = 1 if target.is_checked_out else -1
+        self.adjust(connection, checked_out=checked_out)
+
+
+# Global stats service instance
+stats_service = StatsService()
+
+event.listen(Book, 'after_insert', stats_service._after_insert)
+event.listen(Book, 'after_update', stats_service._after_update)
+event.listen(Book, 'after_delete', stats_service._after_delete)
@@ -0,0 +1,365 @@
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from src.models.book import Book
+from src.models.user import db
+from src.services.metrics import metrics
+from src.services.search_service import tokenize
+from src.services.stats_service import stats_service
+
+SUGGEST_FIELDS = ('title', 'author', 'isbn')
+# Prefixes that can only be an ISBN: a digit, then digits, X, hyphens or spaces
+ISBN_PREFIX_RE = re.compile(r'^\s*\d[\dxX\s-]*$')
+DEFAULT_SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 20
+# Keys are cut to this length; longer prefixes match on their first KEY_LENGTH characters
+KEY_LENGTH = 24
+# Word starts indexed per title or author ("the great gatsby", "great gatsby", "gatsby")
+MAX_WORD_STARTS = 6
+# Matching keys examined per lookup before ranking, which bounds the cost of one-letter prefixes
+SCAN_LIMIT = 200
+LOAD_BATCH_SIZE = 5000
+# How long a suggestion waits for a worker's first load before answering 503
+LOAD_WAIT_TIMEOUT = 5
+LOAD_RETRY_DELAY = 10
+# Rows updated this long before the last sync are read again, to cover clock skew between hosts
+SYNC_OVERLAP = timedelta(seconds=60)
+# Batches up to this many books are inserted key by key; larger ones are merged into a new copy
+MERGE_THRESHOLD = 8
+
+
+def normalize(value):
+    """Lowercase, accent-free words joined by single spaces, as the search index tokenizes them"""
+    return ' '.join(tokenize(value))
+
+
+def _keys(title, author, isbn):
+    """Yield ``(key, field index, word index)`` for one book"""
+    for field, value in ((0, title), (1, author)):
+        text = normalize(value)
+        start = 0
+        for word in range(MAX_WORD_STARTS):
+            if start >= len(text):
+                break
+            yield text[start:start + KEY_LENGTH], field, word
+            start = text.find(' ', start) + 1
+            if not start:
+                break
+    if isbn:
+        compact = _isbn_key(isbn)
+        if compact:
+            yield compact, 2, 0
+
+
+def _isbn_key(value):
+    """The ISBN without separators, lowercased and cut to KEY_LENGTH"""
+    return ''.join(c for c in value.lower() if c.isdigit() or c == 'x')[:KEY_LENGTH]
+
+
+def _ref(book_id, field, word):
+    return book_id << 5 | field << 3 | word
+
+
+def _entries(books):
+    """Sorted ``(key, ref)`` pairs for ``books`` ({id: (title, author, isbn)})"""
+    return sorted(
+        (key, _ref(book_id, field, word))
+        for book_id, book in books.items()
+        for key, field, word in _keys(*book)
+    )
+
+
+def changed_books_statement(since):
+    """Books updated at or after ``since``, as the sync re-reads them"""
+    return select(Book.id, Book.title, Book.author, Book.isbn).where(Book.updated_at >= since)
+
+
+class SuggestIndex:
+    """Typeahead over titles, authors and ISBNs from a sorted in-memory array.
+
+    Every word start of a normalized title or author, and the ISBN without
+    separators, is a key in one sorted list; a parallel ``array`` holds
+    each key's book id, field and word position. A lookup is a bisect plus
+    a short forward scan and never touches the database.
+
+    Each worker loads the index in a background thread started by its
+    first request, so booting stays cheap and only suggestions that arrive
+    during the load wait for it. Book creates, updates, deletes and imports
+    update it in place after they commit; imports and syncs that touch
+    many books merge them into a new copy outside the lock and swap it in,
+    so suggestions are not blocked behind one insert per key. Writes made
+    in other workers are picked up by the same thread, which checks the
+    catalog version every ``SUGGEST_SYNC_INTERVAL`` seconds and re-reads
+    recently updated rows, reloading everything when books were deleted.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.sync_interval = 30
+        self.loaded = False
+        self._keys = []
+        self._refs = array('q')
+        self._books = {}  # id -> (title, author, isbn) as displayed
+        self._version = None
+        self._synced_at = None
+        self._generation = 0  # bumped by every change to the keys
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread_pid = None
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.sync_interval = app.config.get('SUGGEST_SYNC_INTERVAL', 30)
+        self.loaded = False
+        app.before_request(self.ensure_started)
+
+    def ensure_started(self):
+        """Start loading and syncing the index in this process (once per fork)"""
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, name='suggest-index', daemon=True).start()
+
+    def load(self):
+        """Rebuild the whole index from the book table (requires app context)"""
+        version, _ = stats_service.catalog_version()
+        started = datetime.utcnow()
+        books = {}
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(Book.id, Book.title, Book.author, Book.isbn)
+                .where(Book.id > last_id).order_by(Book.id).limit(LOAD_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                books[row.id] = (row.title, row.author, row.isbn)
+            last_id = rows[-1].id
+        db.session.commit()
+
+        entries = _entries(books)
+        keys = [key for key, _ in entries]
+        refs = array('q', (ref for _, ref in entries))
+
+        with self._lock:
+            self._keys, self._refs, self._books = keys, refs, books
+            self._version, self._synced_at = version, started
+            self._generation += 1
+            self.loaded = True
+        self._ready.set()
+        metrics.suggest_index_loaded(len(keys), self.memory()['total'])
+        return len(books)
+
+    def put(self, book_id, title, author, isbn):
+        """Add or replace one book after its write has committed"""
+        with self._lock:
+            if self.loaded:
+                self._put(book_id, (title, author, isbn))
+
+    def put_rows(self, rows):
+        """``put`` for mappings with ``id``, ``title``, ``author`` and ``isbn`` (bulk imports)"""
+        self._put_many({row['id']: (row['title'], row['author'], row['isbn']) for row in rows})
+
+    def remove(self, book_id):
+        """Drop one book after its delete has committed"""
+        with self._lock:
+            if self.loaded:
+                self._remove(book_id)
+
+    def suggest(self, prefix, limit=DEFAULT_SUGGEST_LIMIT):
+        """Up to ``limit`` suggestions for a typed prefix, or None if the index is still loading.
+
+        Whole-field matches rank before word matches inside a field, titles
+        before authors before ISBNs, then shorter values first.
+        """
+        self.ensure_started()
+        if not self.loaded and not self._ready.wait(LOAD_WAIT_TIMEOUT):
+            return None
+        key = normalize(prefix)[:KEY_LENGTH]
+        # "1984 orwell" or "catch 22" are not ISBNs; their digits must not scan the ISBN keys
+        isbn_key = _isbn_key(prefix) if ISBN_PREFIX_RE.match(prefix) else ''
+        if not key:
+            return []
+
+        candidates = []
+        with self._lock:
+            keys, refs = self._keys, self._refs
+            for lookup in {key, isbn_key} - {''}:
+                start = bisect_left(keys, lookup)
+                for i in range(start, min(len(keys), start + SCAN_LIMIT)):
+                    if not keys[i].startswith(lookup):
+                        break
+                    candidates.append(refs[i])
+            books = self._books
+
+        ranked = []
+        for ref in set(candidates):
+            book_id, field, word = ref >> 5, ref >> 3 & 3, ref & 7
+            book = books.get(book_id)
+            if book is None or book[field] is None:
+                continue
+            value = book[field]
+            ranked.append((word > 0, field, len(value), value, book_id))
+        ranked.sort()
+
+        results = []
+        seen = set()
+        for _, field, _, value, book_id in ranked:
+            # One entry per author, and per title when several copies share it
+            if (field, value.lower()) in seen:
+                continue
+            seen.add((field, value.lower()))
+            suggestion = {'value': value, 'field': SUGGEST_FIELDS[field]}
+            if field != 1:
+                suggestion['book_id'] = book_id
+            results.append(suggestion)
+            if len(results) >= limit:
+                break
+        return results
+
+    def sync(self):
+        """Apply writes made by other processes since the last sync (requires app context).
+
+        One primary-key read when nothing changed; otherwise re-reads rows
+        updated since the last sync, or reloads if the book count shows
+        deletions. Returns the number of rows re-read, or None after a reload.
+        """
+        version, _ = stats_service.catalog_version()
+        if version == self._version:
+            db.session.commit()
+            return 0
+
+        started = datetime.utcnow()
+        rows = db.session.execute(changed_books_statement(self._synced_at - SYNC_OVERLAP)).all()
+        total = db.session.execute(select(func.count()).select_from(Book)).scalar()
+        db.session.commit()
+
+        self._put_many({row.id: (row.title, row.author, row.isbn) for row in rows})
+        with self._lock:
+            if len(self._books) == total:
+                self._version, self._synced_at = version, started
+                return len(rows)
+        self.load()
+        return None
+
+    def memory(self):
+        """Approximate bytes held by the index, by structure"""
+        with self._lock:
+            keys, refs, books = self._keys, self._refs, self._books
+            sizes = {
+                'keys': sys.getsizeof(keys) + sum(map(sys.getsizeof, keys)),
+                'refs': sys.getsizeof(refs),
+                'books': sys.getsizeof(books) + sum(
+                    sys.getsizeof(book) + sum(map(sys.getsizeof, filter(None, book)))
+                    for book in books.values()
+                )
+            }
+        sizes['total'] = sum(sizes.values())
+        return sizes
+
+    def stats(self):
+        return {
+            'loaded': self.loaded,
+            'books': len(self._books),
+            'entries': len(self._keys),
+            'bytes': self.memory(),
+            'catalog_version': self._version,
+            'synced_at': self._synced_at.isoformat() if self._synced_at else None
+        }
+
+    def _put_many(self, books):
+        """Add or replace ``books`` ({id: (title, author, isbn)}).
+
+        Small batches are inserted key by key under the lock. Larger ones
+        are merged with a snapshot of the index outside it: the surviving
+        entries and the new ones are two sorted runs, which ``sorted``
+        merges in linear time. The result is swapped in only if nothing
+        changed the index meanwhile, and rebuilt otherwise.
+        """
+        if len(books) <= MERGE_THRESHOLD:
+            with self._lock:
+                if self.loaded:
+                    for book_id, book in books.items():
+                        self._put(book_id, book)
+            return
+
+        new_entries = _entries(books)
+        while True:
+            with self._lock:
+                if not self.loaded:
+                    return
+                keys, refs, generation = self._keys, self._refs, self._generation
+
+            entries = [(key, ref) for key, ref in zip(keys, refs) if ref >> 5 not in books]
+            entries.extend(new_entries)
+            entries.sort()
+            merged_keys = [key for key, _ in entries]
+            merged_refs = array('q', (ref for _, ref in entries))
+
+            with self._lock:
+                if self._generation == generation:
+                    self._keys, self._refs = merged_keys, merged_refs
+                    self._books.update(books)
+                    self._generation += 1
+                    return
+
+    # Mutations; callers hold the lock
+
+    def _put(self, book_id, book):
+        self._remove(book_id)
+        self._books[book_id] = book
+        self._generation += 1
+        for key, field, word in _keys(*book):
+            i = bisect_right(self._keys, key)
+            self._keys.insert(i, key)
+            self._refs.insert(i, _ref(book_id, field, word))
+
+    def _remove(self, book_id):
+        book = self._books.pop(book_id, None)
+        if book is None:
+            return
+        self._generation += 1
+        for key, field, word in _keys(*book):
+            ref = _ref(book_id, field, word)
+            i = bisect_left(self._keys, key)
+            while i < len(self._keys) and self._keys[i] == key:
+                if self._refs[i] == ref:
+                    del self._keys[i]
+                    del self._refs[i]
+                    break
+                i += 1
+
+    # Background load and sync, one thread per process
+
+    def _run(self):
+        while not self.loaded:
+            try:
+                with self.app.app_context():
+                    self.load()
+            except Exception as e:
+                print(f"Suggestion index load failed: {e}")
+                time.sleep(LOAD_RETRY_DELAY)
+
+        while self.sync_interval:
+            time.sleep(self.sync_interval)
+            try:
+                with self.app.app_context():
+                    self.sync()
+            except Exception as e:
+                print(f"Suggestion index sync failed: {e}")
+
+
+# Global suggestion index instance
+suggest_index = SuggestIndex()
@@ -0,0 +1,99 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime
+import click
+from sqlalchemy import select, delete, or_
+from src.models.user import RefreshToken, db
+from src.services.metrics import metrics
+
+DEFAULT_BATCH_SIZE = 1000
+# Pause between scheduled batches so other writers get the database (SQLite has one writer)
+SCHEDULED_BATCH_PAUSE = 0.05
+
+
+class TokenPruner:
+    """Deletes expired and revoked refresh tokens in bounded batches.
+
+    Every login revokes the user's previous refresh token, so without
+    pruning the table grows with every sign-in. Runs from ``flask
+    tokens-prune`` (e.g. a cron job) and, unless
+    ``REFRESH_TOKEN_PRUNE_INTERVAL`` is 0, from a background thread in each
+    worker. The workers' runs are spread out with random jitter; overlapping
+    runs only delete the same rows twice.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.interval = 0
+        self._scheduler_pid = None
+        self._lock = threading.Lock()
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('REFRESH_TOKEN_PRUNE_INTERVAL', 3600)
+        if self.interval:
+            app.before_request(self.ensure_scheduler)
+
+        @app.cli.command('tokens-prune')
+        @click.option('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, show_default=True)
+        def tokens_prune(batch_size):
+            """Delete expired and revoked refresh tokens."""
+            start = time.perf_counter()
+            count = self.prune(batch_size=batch_size)
+            print(f"Deleted {count} refresh tokens in {time.perf_counter() - start:.2f}s")
+
+    def prune(self, batch_size=DEFAULT_BATCH_SIZE, pause=0.0, now=None):
+        """Delete tokens that can no longer be used; returns the number deleted (requires app context).
+
+        Walks the primary key in batches of ``batch_size`` rows, each deleted
+        and committed in its own short transaction.
+        """
+        now = now or datetime.utcnow()
+        deleted = 0
+        last_id = 0
+        while True:
+            ids = db.session.execute(
+                select(RefreshToken.id)
+                .where(RefreshToken.id > last_id, or_(RefreshToken.is_revoked == True, RefreshToken.expires_at <= now))
+                .order_by(RefreshToken.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                db.session.commit()
+                break
+            deleted += db.session.execute(delete(RefreshToken).where(RefreshToken.id.in_(ids))).rowcount
+            db.session.commit()
+            last_id = ids[-1]
+            if pause:
+                time.sleep(pause)
+        metrics.tokens_pruned(deleted)
+        return deleted
+
+    def ensure_scheduler(self):
+        """Start the pruning thread in this process (once per fork)"""
+        if self._scheduler_pid == os.getpid():
+            return
+        with self._lock:
+            if self._scheduler_pid == os.getpid():
+                return
+            self._scheduler_pid = os.getpid()
+        threading.Thread(target=self._schedule_loop, name='token-pruner', daemon=True).start()
+
+    def _schedule_loop(self):
+        while True:
+            time.sleep(self.interval * random.uniform(0.5, 1.5))
+            try:
+                with self.app.app_context():
+                    count = self.prune(pause=SCHEDULED_BATCH_PAUSE)
+                if count:
+                    print(f"Pruned {count} refresh tokens")
+            except Exception as e:
+                print(f"Refresh token pruning failed: {e}")
+
+
+# Global token pruner instance
+token_pruner = TokenPruner()
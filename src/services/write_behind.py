@@ -0,0 +1,114 @@
+import atexit
+import os
+import threading
+from sqlalchemy import update, bindparam, or_
+from src.models.user import db
+from src.services.metrics import metrics
+
+FLUSH_CHUNK_SIZE = 500
+
+
+class WriteBehindBuffer:
+    """Batches writes to telemetry-style timestamp columns such as ``users.last_login``.
+
+    ``record`` only updates an in-memory map (latest value per row), so hot
+    paths like login no longer write these columns in their own
+    transaction. A background thread per process writes the buffered
+    values every ``WRITE_BEHIND_INTERVAL`` seconds, or sooner once
+    ``WRITE_BEHIND_MAX_PENDING`` rows are waiting, as one executemany
+    UPDATE per column. Values only move forward, so a worker flushing late
+    never overwrites a newer timestamp. Values still buffered when a worker
+    is killed without a clean exit are lost, which is acceptable for
+    telemetry but not for data.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.interval = 5
+        self.max_pending = 1000
+        self._pending = {}  # 'table.column' -> {row id: value}
+        self._columns = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher_pid = None
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('WRITE_BEHIND_INTERVAL', 5)
+        self.max_pending = app.config.get('WRITE_BEHIND_MAX_PENDING', 1000)
+
+    def record(self, column, row_id, value):
+        """Buffer ``column = value`` (``column`` like ``User.last_login``) for the row with id ``row_id``"""
+        name = f'{column.table.name}.{column.key}'
+        with self._lock:
+            self._columns[name] = column
+            values = self._pending.setdefault(name, {})
+            if row_id not in values or values[row_id] < value:
+                values[row_id] = value
+            pending = sum(len(values) for values in self._pending.values())
+        self._ensure_flusher()
+        if pending >= self.max_pending:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return sum(len(values) for values in self._pending.values())
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written"""
+        with self._lock:
+            batches, self._pending = self._pending, {}
+        written = 0
+        for name, values in batches.items():
+            try:
+                with self.app.app_context():
+                    self._write(self._columns[name], values)
+            except Exception as e:
+                # Keep the values for the next attempt unless newer ones arrived
+                with self._lock:
+                    current = self._pending.setdefault(name, {})
+                    for row_id, value in values.items():
+                        if row_id not in current or current[row_id] < value:
+                            current[row_id] = value
+                print(f"Write-behind flush of {name} failed: {e}")
+                continue
+            metrics.write_behind_flushed(name, len(values))
+            written += len(values)
+        return written
+
+    def _write(self, column, values):
+        table = column.table
+        target = table.c[column.key]
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam('row_id'))
+            .where(or_(target.is_(None), target < bindparam('value')))
+            .values({column.key: bindparam('value')})
+        )
+        rows = [{'row_id': row_id, 'value': value} for row_id, value in values.items()]
+        with db.engine.begin() as connection:
+            for start in range(0, len(rows), FLUSH_CHUNK_SIZE):
+                connection.execute(statement, rows[start:start + FLUSH_CHUNK_SIZE])
+
+    def _ensure_flusher(self):
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='write-behind', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self.pending():
+                self.flush()
+
+
+# Global write-behind buffer instance
+write_behind = WriteBehindBuffer()
@@ -0,0 +1,138 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Named engine profiles. ``pragmas`` are applied to every new SQLite
+# connection; ``engine_options`` go to SQLALCHEMY_ENGINE_OPTIONS.
+DATABASE_PROFILES = {
+    # Concurrent readers alongside one writer; writers wait instead of
+    # failing with "database is locked". NORMAL is durable in WAL mode
+    # except for the last transactions before a power loss.
+    'sqlite': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'busy_timeout': 5000,
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024  # negative means KiB
+        },
+        'engine_options': {
+            'connect_args': {'timeout': 5}
+        }
+    },
+    # PostgreSQL/MySQL behind gunicorn: a small pool per worker, checked
+    # before use and recycled before server or proxy idle timeouts.
+    'server': {
+        'pragmas': {},
+        'engine_options': {
+            'pool_size': 5,
+            'max_overflow': 10,
+            'pool_timeout': 10,
+            'pool_pre_ping': True,
+            'pool_recycle': 1800
+        }
+    },
+    # SQLAlchemy defaults, e.g. for debugging a profile
+    'default': {
+        'pragmas': {},
+        'engine_options': {}
+    }
+}
+
+# Environment overrides: variable -> (section, key, type)
+PROFILE_OVERRIDES = {
+    'SQLITE_BUSY_TIMEOUT_MS': ('pragmas', 'busy_timeout', int),
+    'SQLITE_SYNCHRONOUS': ('pragmas', 'synchronous', str),
+    'SQLITE_MMAP_SIZE': ('pragmas', 'mmap_size', int),
+    'SQLITE_CACHE_SIZE': ('pragmas', 'cache_size', int),
+    'DB_POOL_SIZE': ('engine_options', 'pool_size', int),
+    'DB_MAX_OVERFLOW': ('engine_options', 'max_overflow', int),
+    'DB_POOL_TIMEOUT': ('engine_options', 'pool_timeout', int),
+    'DB_POOL_RECYCLE': ('engine_options', 'pool_recycle', int)
+}
+
+
+def select_profile(database_url, name=None, environ=os.environ):
+    """Resolve the profile for a database URL, applying environment overrides.
+
+    ``name`` (from ``DB_PROFILE``) wins; otherwise SQLite URLs get the
+    ``sqlite`` profile and everything else ``server``. Overrides only
+    replace settings the profile already has. Returns ``(name, profile)``.
+    """
+    if not name:
+        name = 'sqlite' if make_url(database_url).get_backend_name() == 'sqlite' else 'server'
+    if name not in DATABASE_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {name!r}, expected one of: {', '.join(DATABASE_PROFILES)}")
+
+    base = DATABASE_PROFILES[name]
+    profile = {'pragmas': dict(base['pragmas']), 'engine_options': dict(base['engine_options'])}
+    for variable, (section, key, cast) in PROFILE_OVERRIDES.items():
+        if environ.get(variable) and key in profile[section]:
+            profile[section][key] = cast(environ[variable])
+    return name, profile
+
+
+def configure_engine_options(app):
+    """Pick the profile for SQLALCHEMY_DATABASE_URI; call before ``db.init_app``"""
+    name, profile = select_profile(app.config['SQLALCHEMY_DATABASE_URI'], app.config.get('DB_PROFILE'))
+    options = dict(profile['engine_options'])
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    app.config['DB_PROFILE'] = name
+    app.extensions['db_profile'] = profile
+
+
+def install_engine_hooks(app, db):
+    """Apply SQLite pragmas per connection and reset pools in forked children.
+
+    Call after ``db.init_app``. Nothing connects here; the effective
+    settings are read back on the first connection and published as the
+    ``db_engine_info`` metric.
+    """
+    from src.services.metrics import metrics
+
+    profile = app.extensions['db_profile']
+    pragmas = profile['pragmas']
+    with app.app_context():
+        engine = db.engine
+
+    settings = {'profile': app.config['DB_PROFILE'], 'dialect': engine.dialect.name}
+    metrics.registry.gauge('db_engine_info', 'Database engine profile and settings in effect', mode='max')
+    if engine.dialect.name == 'sqlite' and pragmas:
+        event.listen(engine, 'connect', _pragma_listener(pragmas, settings))
+    else:
+        pool = engine.pool
+        settings['pool'] = type(pool).__name__
+        for key in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_pre_ping', 'pool_recycle'):
+            if key in profile['engine_options']:
+                settings[key] = str(profile['engine_options'][key])
+        metrics.registry.set('db_engine_info', 1, **settings)
+
+    # Connections inherited through fork() share sockets/file handles with
+    # the parent; children must open their own (matters with --preload).
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+    return settings
+
+
+def _pragma_listener(pragmas, settings):
+    from src.services.metrics import metrics
+
+    statements = [f'PRAGMA {key}={value}' for key, value in pragmas.items()]
+    reported = []
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+            if not reported:
+                # Report the values SQLite accepted, once per process
+                for key in pragmas:
+                    settings[key] = str(cursor.execute(f'PRAGMA {key}').fetchone()[0])
+                metrics.registry.set('db_engine_info', 1, **settings)
+                reported.append(True)
+        finally:
+            cursor.close()
+
+    return set_pragmas
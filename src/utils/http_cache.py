@@ -0,0 +1,62 @@
+import hashlib
+from datetime import timezone
+from flask import current_app, request, make_response
+
+
+def make_etag(*parts):
+    """Build a strong ETag value from the parts that determine a response body"""
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def normalized_query_string():
+    """The request's query arguments in a stable order, for cache keys and ETags"""
+    return '&'.join(f'{key}={value}' for key, value in sorted(request.args.items(multi=True)))
+
+
+def _http_datetime(value):
+    # HTTP dates have one-second resolution and are always UTC
+    if value is None:
+        return None
+    return value.replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def is_not_modified(etag, last_modified=None):
+    """Check If-None-Match (preferred) or If-Modified-Since against the current version"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified is not None:
+        return _http_datetime(last_modified) <= request.if_modified_since
+    return False
+
+
+def set_cache_headers(response, etag, last_modified=None, vary=()):
+    """Add validators and Cache-Control to a catalog response.
+
+    Anonymous responses are public so a CDN can store them, but must be
+    revalidated (cheaply, via 304) unless ``CATALOG_CDN_MAX_AGE`` allows
+    shared caches to serve them for a few seconds. Responses to
+    authenticated requests include per-user data and stay private.
+    ``vary`` names further request headers the body depends on, e.g.
+    ``Accept`` where the format is negotiated.
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _http_datetime(last_modified)
+
+    if 'Authorization' in request.headers:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    else:
+        cache_control = 'public, max-age=0, must-revalidate'
+        cdn_max_age = current_app.config.get('CATALOG_CDN_MAX_AGE', 0)
+        if cdn_max_age:
+            cache_control += f', s-maxage={cdn_max_age}'
+        response.headers['Cache-Control'] = cache_control
+    response.vary.add('Authorization')
+    for header in vary:
+        response.vary.add(header)
+    return response
+
+
+def not_modified(etag, last_modified=None, vary=()):
+    """An empty 304 response carrying the same validators and caching headers"""
+    return set_cache_headers(make_response('', 304), etag, last_modified, vary)
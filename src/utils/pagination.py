@@ -0,0 +1,131 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from flask import request
+from sqlalchemy import DateTime, tuple_
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+def get_per_page():
+    """Read per_page from the query string, clamped to 1..MAX_PER_PAGE"""
+    per_page = request.args.get('per_page', DEFAULT_PER_PAGE, type=int)
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def get_bool_arg(name, default=False):
+    """Read a boolean flag such as ?with_total=1 from the query string"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def _cursor_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def encode_cursor(sort_key, values):
+    """Encode the sort key and last-row values as an opaque cursor"""
+    payload = json.dumps({'k': sort_key, 'v': values}, separators=(',', ':'), default=_cursor_default)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_key, size):
+    """Decode a cursor produced by encode_cursor, raising ValueError if it is invalid"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload['v']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Invalid cursor')
+
+    if payload.get('k') != sort_key or not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def keyset_paginate(query, columns, per_page, cursor=None, sort_key='id'):
+    """Return (items, next_cursor) for the page after ``cursor``.
+
+    Seeks directly to the first row after the cursor using the (unique)
+    ordering ``columns`` instead of OFFSET, so deep pages cost the same as
+    the first one. An empty cursor starts from the beginning.
+    """
+    items = keyset_query(query, columns, per_page + 1, cursor=cursor, sort_key=sort_key).all()
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor(sort_key, [getattr(items[-1], column.key) for column in columns])
+
+    return items, next_cursor
+
+
+def keyset_query(query, columns, limit, cursor=None, sort_key='id'):
+    """``query`` restricted to the ``limit`` rows after ``cursor`` in ``columns`` order.
+
+    Raises ValueError for an invalid cursor.
+    """
+    if cursor:
+        values = decode_cursor(cursor, sort_key, len(columns))
+        # Datetimes travel as ISO strings; the column types need them back as datetimes
+        try:
+            values = [
+                datetime.fromisoformat(value) if isinstance(column.type, DateTime) and isinstance(value, str) else value
+                for column, value in zip(columns, values)
+            ]
+        except ValueError:
+            raise ValueError('Invalid cursor')
+        query = query.filter(tuple_(*columns) > tuple_(*values))
+
+    return query.order_by(None).order_by(*columns).limit(limit)
+
+
+class CountCache:
+    """Short-lived cache of COUNT(*) results keyed by the compiled query.
+
+    Totals for listings only need to be roughly right, so a count is reused
+    for ``ttl`` seconds instead of being recomputed on every page.
+    """
+
+    def __init__(self, ttl=30, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def count(self, query, version=None):
+        """Return the row count of ``query``; pass a data version to drop counts from older versions"""
+        query = query.order_by(None)
+        compiled = query.statement.compile()
+        key = (version, str(compiled), repr(sorted(compiled.params.items())))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+
+        total = query.count()
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (total, now + self.ttl)
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Global count cache instance
+count_cache = CountCache()
@@ -0,0 +1,60 @@
+from types import MappingProxyType
+
+
+class PermissionEngine:
+    """Role -> permission sets compiled into integer bitmasks.
+
+    Each permission gets one bit, in the enum's declaration order. That
+    order is part of the access-token format (the ``perms`` claim), so new
+    permissions must be added at the end of the enum. Checks are a dict
+    lookup and a bitwise AND; the permission names for a mask are built
+    once and then served from a table.
+    """
+
+    def __init__(self, permissions, role_permissions):
+        self.permissions = tuple(permissions)
+        self.bits = MappingProxyType({permission: 1 << i for i, permission in enumerate(self.permissions)})
+        self.all_mask = (1 << len(self.permissions)) - 1
+        self.role_masks = MappingProxyType({
+            role: self.compile(granted) for role, granted in role_permissions.items()
+        })
+        self._names = {}
+        for mask in self.role_masks.values():
+            self.names(mask)
+
+    def compile(self, permissions):
+        """Bitmask for an iterable of permissions"""
+        mask = 0
+        for permission in permissions:
+            mask |= self.bits[permission]
+        return mask
+
+    def mask(self, role):
+        """Bitmask of everything a role may do (0 for an unknown role)"""
+        return self.role_masks.get(role, 0)
+
+    def allows(self, mask, permission):
+        return bool(mask & self.bits[permission])
+
+    def role_allows(self, role, permission):
+        return bool(self.role_masks.get(role, 0) & self.bits[permission])
+
+    def names(self, mask):
+        """Permission values in a mask, in declaration order"""
+        names = self._names.get(mask)
+        if names is None:
+            # At most 2**len(permissions) distinct masks, in practice one per role
+            names = self._names[mask] = tuple(
+                permission.value for permission in self.permissions if mask & self.bits[permission]
+            )
+        return names
+
+    def from_claim(self, value, role):
+        """Mask from a token's ``perms`` claim, limited to what ``role`` grants today.
+
+        Returns None if the claim is missing or malformed.
+        """
+        if type(value) is not int or value < 0 or value > self.all_mask:
+            return None
+        # A token issued before a role lost a permission must not keep it
+        return value & self.mask(role)
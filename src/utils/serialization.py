@@ -0,0 +1,80 @@
+import json
+from datetime import date, datetime
+from enum import Enum
+from flask import request
+from src.models.user import db
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(data):
+    """Encode data as compact JSON bytes; datetimes as ISO 8601 and enums by value.
+
+    Uses orjson when it is installed and the standard library otherwise;
+    both produce the same output as ``to_dict()`` + ``jsonify``.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=_default, separators=(',', ':')).encode()
+
+
+def csv_value(value):
+    """Format a column value for CSV output the same way the JSON encoder does"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def parse_fields(model):
+    """Field names requested with ``?fields=a,b``, or all of ``model.FIELDS``.
+
+    Raises ValueError for names the model does not expose.
+    """
+    raw = request.args.get('fields')
+    if not raw:
+        return list(model.FIELDS)
+
+    names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in names if name not in model.FIELDS]
+    if unknown or not names:
+        raise ValueError(f"Invalid fields: {', '.join(unknown) or raw}. Allowed: {', '.join(model.FIELDS)}")
+    return names
+
+
+class Projection:
+    """Column-only query over a model for list endpoints.
+
+    Selects just the requested columns (plus any ``extra_columns`` needed
+    for ordering or cursors) as plain row tuples, skipping ORM object
+    construction and the identity map, and turns rows into dicts holding
+    only the requested fields.
+    """
+
+    def __init__(self, model, names, extra_columns=()):
+        self.names = list(names)
+        keys = self.names + [column.key for column in extra_columns if column.key not in self.names]
+        self.columns = [getattr(model, key) for key in keys]
+
+    def query(self):
+        return db.session.query(*self.columns)
+
+    def to_dict(self, row):
+        # zip stops at the requested names, dropping trailing extra columns
+        return dict(zip(self.names, row))
+
+    def to_dicts(self, rows):
+        names = self.names
+        return [dict(zip(names, row)) for row in rows]
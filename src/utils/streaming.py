@@ -0,0 +1,76 @@
+import csv
+import io
+from flask import Response, request, stream_with_context
+from src.utils.serialization import dumps, csv_value
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+CSV_MIMETYPE = 'text/csv'
+STREAM_CHUNK_SIZE = 500
+
+
+def get_stream_format():
+    """Return 'ndjson' or 'csv' if the client asked for a streamed export, else None.
+
+    Either ``?format=ndjson|csv`` or an ``Accept: application/x-ndjson``
+    header selects streaming; everything else gets the regular JSON body.
+    """
+    fmt = request.args.get('format', '').lower()
+    if fmt in ('ndjson', 'csv'):
+        return fmt
+    if request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+        return 'ndjson'
+    return None
+
+
+def stream_query(query, serialize, fieldnames, fmt, filename='export'):
+    """Stream the rows of an ORM query as NDJSON or CSV.
+
+    Rows are fetched ``STREAM_CHUNK_SIZE`` at a time with ``yield_per``
+    (a server-side cursor where the driver supports one) and written out
+    chunk by chunk, so memory use does not grow with the result size.
+    """
+    def generate():
+        buffer = io.StringIO()
+        writer = None
+        if fmt == 'csv':
+            writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+        lines = []
+
+        pending = 0
+        for item in query.yield_per(STREAM_CHUNK_SIZE):
+            row = serialize(item)
+            if writer:
+                writer.writerow({key: csv_value(value) for key, value in row.items()})
+            else:
+                lines.append(dumps(row))
+
+            pending += 1
+            if pending >= STREAM_CHUNK_SIZE:
+                yield _flush(buffer, lines)
+                pending = 0
+
+        chunk = _flush(buffer, lines)
+        if chunk:
+            yield chunk
+
+    headers = {}
+    if fmt == 'csv':
+        mimetype = CSV_MIMETYPE
+        headers['Content-Disposition'] = f'attachment; filename={filename}.csv'
+    else:
+        mimetype = NDJSON_MIMETYPE
+
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers=headers)
+
+
+def _flush(buffer, lines):
+    """Return everything buffered since the last flush as bytes and reset the buffers"""
+    if lines:
+        chunk = b'\n'.join(lines) + b'\n'
+        lines.clear()
+        return chunk
+    chunk = buffer.getvalue().encode()
+    buffer.seek(0)
+    buffer.truncate()
+    return chunk